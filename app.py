@@ -1,165 +1,1047 @@
 import streamlit as st
 import json
-import csv
 import io
-from typing import List, Dict
-import PyPDF2
+import os
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple, Union
 import re
 import requests
+import hashlib
+import math
+import tempfile
+import threading
 import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from rate_control import Cancelled, get_rate_controller, parse_retry_after
+from card_cache import GenerationCache, make_cache_key
+from pdf_extraction import count_pdf_pages, iter_pdf_pages
+from chunking import TextChunker, iter_blocks, split_sentences
+from ranking import SentenceRanker
+from local_inference import get_local_model, is_local_model_loaded
+from readiness import get_readiness_tracker
+from dedup import NearDuplicateIndex
+from cards import Deck
+from deck_store import DeckStore, content_hash
+from exporters import iter_anki_text, iter_csv, iter_json, write_apkg, write_text
+from metrics import DeckMetrics, get_metrics, record_deck, start_metrics_server
+from estimator import get_latency_estimator
+from jobs import Job, QueueFull, get_job_queue
+
+# Question types asked of the model for every chunk
+PROMPT_TEMPLATES = [
+    "Create a definition question about the key concepts in this {subject} text: {chunk}. Format: Question: [question] Answer: [answer]",
+    "Create a 'how' or 'why' question about the processes described in this {subject} text: {chunk}. Format: Question: [question] Answer: [answer]",
+    "Create a factual question about important details in this {subject} text: {chunk}. Format: Question: [question] Answer: [answer]"
+]
+
+# Packed mode asks for several cards in one prompt so the chunk is only sent once
+PACKED_PROMPT_TEMPLATE = (
+    "Create {count} different flashcards about this {subject} text: {chunk}. "
+    "Mix definition, 'how' or 'why', and factual questions. "
+    "Format each one as: Question: [question] Answer: [answer]"
+)
+
+_QA_PAIR = re.compile(r"Question:\s*(.*?)\s*Answer:\s*(.*?)\s*(?=Question:|$)", re.DOTALL)
+
+DEFAULT_API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-large"
+
+# One sentence in this many ends a chunk early (once half full) in incremental mode
+CHUNK_ANCHOR_EVERY = 6
+
+# Exports larger than this are spooled to a temporary file instead of memory
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+# How often the page polls a background generation job (seconds)
+JOB_POLL_SECONDS = 1.0
+
+# With a deadline, how often outstanding requests are checked for hedging (seconds)
+HEDGE_POLL_SECONDS = 0.25
+# A request running longer than its expected latency plus this many standard
+# deviations is hedged with offline cards for its chunk
+HEDGE_AFTER_STDS = 3.0
+# Generic cards the offline engine adds when the content yields too few
+SUBJECT_QUESTIONS = {
+    "biology": [
+        {"question": "What biological process is described in the content?", "answer": "Refer to the main processes mentioned in the material.", "difficulty": "Hard"},
+        {"question": "What are the key biological components discussed?", "answer": "Based on the content provided.", "difficulty": "Medium"}
+    ],
+    "history": [
+        {"question": "What historical period or event is discussed?", "answer": "As described in the content.", "difficulty": "Medium"},
+        {"question": "What were the key causes or effects mentioned?", "answer": "According to the material provided.", "difficulty": "Hard"}
+    ],
+    "general": [
+        {"question": "What is the main topic discussed?", "answer": "Based on the overall content.", "difficulty": "Easy"},
+        {"question": "What are the key points mentioned?", "answer": "As outlined in the material.", "difficulty": "Medium"}
+    ]
+}
+# Card search results shown in the deck library
+LIBRARY_RESULTS = 100
+# Page sizes offered by the deck's List View
+DECK_PAGE_SIZES = (10, 25, 50, 100)
+DIFFICULTY_COLORS = {"Easy": "green", "Medium": "orange", "Hard": "red"}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session(pool_size: int = 16) -> requests.Session:
+    """Return the process-wide keep-alive session used for inference calls
+    
+    Reusing one pooled session lets every generator (and every worker thread)
+    skip the TCP+TLS handshake after the first request to the endpoint.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+class _StreamlitProgress:
+    """Progress bar and status line shown while a deck is generated on the script thread"""
+    
+    def __init__(self, text: str):
+        self.bar = st.progress(0)
+        self.status = st.empty()
+        self.status.text(text)
+    
+    def update(self, fraction: float):
+        self.bar.progress(fraction)
+    
+    def close(self):
+        self.bar.empty()
+        self.status.empty()
+
+class _ListenerProgress:
+    """Forwards progress to a listener such as a background job"""
+    
+    def __init__(self, listener, text: str):
+        self.listener = listener
+        self.text = text
+        listener.progress(0.0, text)
+    
+    def update(self, fraction: float):
+        self.listener.progress(fraction, self.text)
+    
+    def close(self):
+        pass
+
+class _StreamedContent:
+    """Document text arriving as a stream of pieces, such as PDF pages
+    
+    The chunker reads the pieces as they arrive; text() joins them once the
+    whole document is needed, reading whatever the chunker didn't.
+    """
+    
+    def __init__(self, pieces: Iterable[str]):
+        self._pieces = iter(pieces)
+        self._read: List[str] = []
+        self.chars = 0
+    
+    def __iter__(self) -> Iterator[str]:
+        for piece in self._pieces:
+            self._read.append(piece)
+            self.chars += len(piece)
+            yield piece
+    
+    def text(self) -> str:
+        for _ in self:
+            pass
+        return "".join(self._read)
+
+def _text_of(content: Union[str, _StreamedContent]) -> str:
+    return content if isinstance(content, str) else content.text()
+
+def quiet_streamlit_logging():
+    """Silence Streamlit's bare-mode warnings for generators run outside a Streamlit script
+    
+    Used by the batch CLI, the HTTP service and the load test. Reading an
+    option first makes Streamlit apply its config before the level is set.
+    """
+    from streamlit import config as streamlit_config, logger as streamlit_logger
+    streamlit_config.get_option("logger.level")
+    streamlit_logger.set_log_level("error")
 
 class FlashcardGenerator:
-    def __init__(self, api_key: str = None, model_type: str = "huggingface"):
-        """Initialize with API key and model type"""
+    def __init__(self, api_key: str = None, model_type: str = "huggingface",
+                 max_concurrency: int = 4, requests_per_second: float = 2.0,
+                 batch_size: int = 4, cache: GenerationCache = None,
+                 deterministic: bool = False, chunk_tokens: int = 256,
+                 overlap_tokens: int = 32, local_checkpoint: str = "google/flan-t5-large",
+                 local_threads: int = None, local_max_batch: int = 8,
+                 ready_ttl: float = 300.0, packed: bool = False,
+                 dedup_threshold: Optional[float] = 0.8, api_url: Optional[str] = None,
+                 incremental: bool = True, chunk_memory: Optional[Dict[str, List[Dict]]] = None):
+        """Initialize with API key and model type
+        
+        max_concurrency caps the number of in-flight API requests and
+        requests_per_second is the starting request rate. Both are adapted
+        at runtime by a controller shared by every generator in the process
+        that uses the same endpoint and token. batch_size is the number of
+        prompts packed into a single inference request.
+        
+        deterministic switches the model to greedy decoding; only in that
+        mode are generations reused from (and stored in) the cache.
+        
+        chunk_tokens and overlap_tokens size content chunks in tokens of the
+        selected model's tokenizer.
+        
+        model_type="local" runs local_checkpoint on this machine's CPU
+        instead of calling the API. The model is loaded once per process and
+        shared; local_threads and local_max_batch tune its generate calls.
+        
+        ready_ttl is how long a positive readiness result for the endpoint
+        is trusted before it is probed again.
+        
+        packed asks for all of a chunk's cards in a single prompt instead of
+        one prompt per question type, whenever a chunk needs more than one
+        card; last_packing_report then records the prompt tokens this saved.
+        
+        dedup_threshold is the estimated Jaccard similarity at which a card
+        counts as a near-duplicate of an earlier one and is dropped; None
+        disables de-duplication. last_dedup_report records what was dropped.
+        
+        api_url overrides the inference endpoint, e.g. to point at a
+        self-hosted deployment or the mock server used for load testing.
+        
+        incremental remembers the model's cards for every chunk of the last
+        deck, keyed by a hash of the chunk and the settings that shaped it.
+        Generating again then only sends chunks that were added or edited.
+        Chunk boundaries are anchored on content so an edit stays local;
+        last_incremental_report records what was reused. chunk_memory is
+        the dict those cards are kept in; pass another generator's to share
+        it, as background jobs do with their session's generator.
+        """
         self.model_type = model_type
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+        self.deterministic = deterministic
+        # Using a better model for text generation - Flan-T5 is good for instruction following
+        self.hf_api_url = api_url or DEFAULT_API_URL
+        self.model_name = self.hf_api_url.split("/models/", 1)[-1]
+        self.endpoint_id = self.hf_api_url
+        self.local_checkpoint = local_checkpoint
+        self.local_threads = local_threads
+        self.local_max_batch = max(1, local_max_batch)
+        if model_type == "local":
+            # One shared model serializes generation, so batch instead of fanning out
+            self.model_name = local_checkpoint
+            self.endpoint_id = f"local:{local_checkpoint}"
+            self.max_concurrency = 1
+            self.batch_size = self.local_max_batch
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self._chunker = None
+        self.incremental = incremental
+        self.chunk_memory: Dict[str, List[Dict]] = chunk_memory if chunk_memory is not None else {}
+        self.last_incremental_report = None
+        self.last_deadline_report = None
+        self.ranker = SentenceRanker()
+        self.packed = packed
+        self.last_packing_report = None
+        # How the current deck's prompts are sent, for the latency estimator
+        self._deck_prompt_type = self._prompt_type()
+        self.dedup_threshold = dedup_threshold
+        self.last_dedup_report = None
+        # Set by background jobs to receive messages and progress instead of the page
+        self.listener = None
+        # Set by background jobs; once set, generation stops even mid-wait or mid-retry
+        self.cancel_event: Optional[threading.Event] = None
         if model_type == "huggingface" and api_key:
-            # Using a better model for text generation - Flan-T5 is good for instruction following
-            self.hf_api_url = "https://api-inference.huggingface.co/models/google/flan-t5-large"
             self.hf_headers = {"Authorization": f"Bearer {api_key}"}
         else:
             self.hf_headers = {}
+        # Rate limits apply per token, so sessions sharing a token share one controller
+        token_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else "anonymous"
+        self.token_id = token_id
+        self.rate_controller = get_rate_controller(f"{self.hf_api_url}#{token_id}",
+                                                   max_concurrency=self.max_concurrency,
+                                                   rate=requests_per_second)
+        self.rate_controller.set_max_concurrency(self.max_concurrency)
+        self.readiness = get_readiness_tracker(self.hf_api_url, ready_ttl=ready_ttl)
+        # Stage timings go to the process-wide registry and to the deck being generated
+        self.metrics = get_metrics()
+        self._deck_metrics = None
+        self.last_deck_metrics = None
+        self.estimator = get_latency_estimator()
+    
+    @contextmanager
+    def _stage(self, stage: str, **labels):
+        """Time one run of a generation stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.metrics.observe(stage, seconds, backend=self.model_type, **labels)
+            deck = self._deck_metrics
+            if deck is not None:
+                deck.add_stage(stage, seconds)
+    
+    def _notify(self, level: str, message: str):
+        """Show an info/warning/error message on the page, or hand it to the listener"""
+        if self.listener is not None:
+            self.listener.notify(level, message)
+        else:
+            getattr(st, level)(message)
+    
+    def _start_progress(self, text: str):
+        """Progress display for one generation run, on the page or through the listener"""
+        if self.listener is not None:
+            return _ListenerProgress(self.listener, text)
+        return _StreamlitProgress(text)
+    
+    def _cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+    
+    def _pause(self, seconds: float) -> bool:
+        """Sleep for seconds, waking early on cancel; returns True if cancelled"""
+        if self.cancel_event is None:
+            time.sleep(seconds)
+            return False
+        return self.cancel_event.wait(seconds)
+    
+    def _count(self, name: str, value: float = 1, **labels):
+        """Bump a counter in the registry and on the deck being generated"""
+        self.metrics.increment(name, value, backend=self.model_type, **labels)
+        deck = self._deck_metrics
+        if deck is not None:
+            deck.increment(name, value)
     
-    def extract_text_from_pdf(self, pdf_file) -> str:
-        """Extract text from uploaded PDF file"""
+    def extract_text_from_pdf(self, pdf_file, page_range: Optional[Tuple[int, int]] = None) -> str:
+        """Extract text from uploaded PDF file
+        
+        page_range is an inclusive, 1-based (first, last) page selection.
+        """
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return "".join(page + "\n" for page in self.iter_pdf_pages(pdf_file, page_range))
         except Exception as e:
-            st.error(f"Error reading PDF: {str(e)}")
+            self._notify("error", f"Error reading PDF: {str(e)}")
             return ""
     
-    def generate_flashcards(self, content: str, subject: str = "General", num_cards: int = 15) -> List[Dict]:
-        """Generate flashcards using selected AI model"""
+    def iter_pdf_pages(self, pdf_file, page_range: Optional[Tuple[int, int]] = None) -> Iterator[str]:
+        """Yield the text of each PDF page lazily, in order, as it is parsed"""
+        with self._stage("pdf_extraction"):
+            yield from iter_pdf_pages(pdf_file, page_range)
+    
+    def generate_flashcards(self, content: Union[str, Iterable[str]], subject: str = "General", num_cards: int = 15,
+                            on_card: Callable[[Dict], None] = None, deadline: Optional[float] = None) -> List[Dict]:
+        """Generate flashcards using selected AI model
+        
+        on_card, if given, is called with each card as soon as it is ready.
+        deadline is a time.monotonic() timestamp; see iter_flashcards.
+        """
+        flashcards = []
+        for card in self.iter_flashcards(content, subject, num_cards, deadline):
+            flashcards.append(card)
+            if on_card:
+                on_card(card)
+        return flashcards
+    
+    def generate_deck(self, content: Union[str, Iterable[str]], subject: str = "General", num_cards: int = 15,
+                      deadline: Optional[float] = None) -> Deck:
+        """Generate into a columnar Deck, converting each card as it arrives
         
-        if self.model_type == "huggingface":
-            return self._generate_huggingface_flashcards(content, subject, num_cards)
+        For large batch runs: no list of card dicts is ever held.
+        """
+        deck = Deck()
+        for card in self.iter_flashcards(content, subject, num_cards, deadline):
+            deck.append(card, subject)
+        return deck
+    
+    def iter_flashcards(self, content: Union[str, Iterable[str]], subject: str = "General", num_cards: int = 15,
+                        deadline: Optional[float] = None) -> Iterator[Dict]:
+        """Yield flashcards in deck order as each chunk finishes generating
+        
+        content may also be a stream of pieces such as the pages from
+        iter_pdf_pages. The model backends then chunk each page as it is
+        parsed while the model warms up, instead of waiting for the whole
+        document.
+        
+        With a deadline (a time.monotonic() timestamp) the model's chunks are
+        requested best-first, requests that run far past their usual latency
+        get offline cards for their chunk on standby while they keep racing,
+        and whatever the model hasn't delivered by the deadline is filled in
+        by the standby cards and the offline engine, so the deck is complete
+        on time.
+        """
+        if not isinstance(content, str):
+            content = _StreamedContent(content)
+        if self.model_type in ("huggingface", "local"):
+            flashcards = self._iter_huggingface_flashcards(content, subject, num_cards, deadline)
         else:
-            return self._generate_offline_flashcards(content, subject, num_cards)
+            flashcards = self._iter_offline_flashcards(_text_of(content), subject, num_cards)
+        
+        if self.dedup_threshold is not None:
+            flashcards = self._deduplicate(flashcards, content, subject, num_cards)
+        return self._tracked(flashcards, subject, num_cards, content)
+    
+    def plan_generation(self, content: str, subject: str, num_cards: int) -> Dict:
+        """Work out the chunks and requests a generation run would need, without running it
+        
+        Chunks the incremental memory still holds and prompts already in the
+        generation cache are counted separately, since they won't be sent.
+        """
+        started = time.perf_counter()
+        content_chunks, total_chunks = self._plan_chunks(content, num_cards)
+        cards_per_chunk = max(1, num_cards // max(total_chunks, 1))
+        use_cache = self.cache is not None and self.deterministic
+        prompts = 0
+        reused_chunks = 0
+        cached_prompts = 0
+        for chunk in content_chunks:
+            if self.incremental and self._chunk_key(chunk, subject, cards_per_chunk) in self.chunk_memory:
+                reused_chunks += 1
+                continue
+            for template, _ in self._chunk_prompts(chunk, subject, cards_per_chunk):
+                if use_cache and self.cache.contains(self._cache_key(template, chunk, subject)):
+                    cached_prompts += 1
+                else:
+                    prompts += 1
+        return {
+            "content_chars": len(content),
+            "total_chunks": total_chunks,
+            "chunks": len(content_chunks),
+            "cards_per_chunk": cards_per_chunk,
+            "reused_chunks": reused_chunks,
+            "cached_prompts": cached_prompts,
+            "prompts": prompts,
+            "requests": math.ceil(prompts / self.batch_size),
+            "chunking_seconds": time.perf_counter() - started,
+        }
+    
+    def estimate_generation_time(self, content: str, subject: str, num_cards: int) -> Dict:
+        """Predict how long generate_flashcards will take from the chunk plan and measured latencies
+        
+        Returns the estimator's prediction: expected seconds, a pessimistic
+        high_seconds and the breakdown and plan behind them.
+        """
+        if self.model_type == "offline":
+            plan = {"content_chars": len(content)}
+            return self.estimator.predict("offline", "single", plan, warm=True)
+        
+        plan = self.plan_generation(content, subject, num_cards)
+        prompt_type = self._prompt_type(plan["cards_per_chunk"])
+        if self.model_type == "local":
+            # The local model runs one batch at a time and isn't rate limited
+            return self.estimator.predict("local", prompt_type, plan, self._local_model_loaded())
+        rate_state = self.rate_controller.snapshot()
+        concurrency = min(self.max_concurrency, rate_state["concurrency_limit"])
+        return self.estimator.predict(self.model_type, prompt_type, plan, self.readiness.is_ready(),
+                                      concurrency, rate_state["rate_per_second"])
+    
+    def _packs(self, cards_per_chunk: int) -> bool:
+        """Whether chunks get one packed prompt; a one-card chunk gains nothing from it"""
+        return self.packed and min(cards_per_chunk, len(PROMPT_TEMPLATES)) > 1
+    
+    def _prompt_type(self, cards_per_chunk: int = len(PROMPT_TEMPLATES)) -> str:
+        return "packed" if self._packs(cards_per_chunk) else "single"
+    
+    def _local_model_loaded(self) -> bool:
+        return is_local_model_loaded(self.local_checkpoint)
+    
+    def _tracked(self, flashcards: Iterator[Dict], subject: str, num_cards: int,
+                 content: Union[str, _StreamedContent]) -> Iterator[Dict]:
+        """Collect per-deck metrics while the deck is generated and publish them at the end"""
+        deck = DeckMetrics(self.model_type, subject, num_cards)
+        self._deck_metrics = deck
+        yielded = 0
+        try:
+            for card in flashcards:
+                yielded += 1
+                yield card
+        finally:
+            deck.finish(yielded)
+            self._deck_metrics = None
+            self.last_deck_metrics = deck.summary()
+            record_deck(deck)
+            # A deck stopped early may not have read all of a streamed document
+            content_chars = len(content) if isinstance(content, str) else content.chars
+            self.estimator.record_deck(self.model_type, self._deck_prompt_type, self.last_deck_metrics, content_chars)
+    
+    def _iter_offline_flashcards(self, content: str, subject: str, num_cards: int) -> Iterator[Dict]:
+        """Offline mode: the rule-based engine is the primary generator"""
+        with self._stage("offline_generation"):
+            flashcards = self._generate_offline_flashcards(content, subject, num_cards)
+        yield from flashcards
+    
+    def _offline_fallback(self, content: str, subject: str, num_cards: int) -> List[Dict]:
+        """Rule-based cards standing in for ones the model didn't produce"""
+        with self._stage("offline_fallback"):
+            flashcards = self._generate_offline_flashcards(content, subject, num_cards)
+        self._count("fallbacks")
+        self._count("fallback_cards", len(flashcards))
+        return flashcards
+    
+    def _deduplicate(self, flashcards: Iterator[Dict], content: Union[str, _StreamedContent], subject: str,
+                     num_cards: int) -> Iterator[Dict]:
+        """Drop near-duplicate cards, topping the deck back up from the offline engine
+        
+        Repetitive content can run out of distinct cards; the deck then comes
+        up short, recorded as "short" in last_dedup_report and warned about.
+        """
+        index = NearDuplicateIndex(self.dedup_threshold)
+        kept = 0
+        dropped = 0
+        self.last_dedup_report = {"kept": 0, "dropped": 0}
+        
+        def candidates():
+            yield from flashcards
+            if kept < num_cards and not self._cancelled():
+                # Ask for extra candidates since some will be duplicates of cards already kept
+                yield from self._offline_fallback(_text_of(content), subject, num_cards * 2)
+            if kept < num_cards:
+                # Then the subject's generic cards, and the general ones after those
+                for questions in (SUBJECT_QUESTIONS.get(subject.lower(), []), SUBJECT_QUESTIONS["general"]):
+                    yield from (dict(card) for card in questions)
+        
+        for card in candidates():
+            if kept >= num_cards:
+                break
+            if index.add(f"{card['question']} {card['answer']}"):
+                kept += 1
+                self.last_dedup_report["kept"] = kept
+                yield card
+            else:
+                dropped += 1
+                self.last_dedup_report["dropped"] = dropped
+        
+        if kept < num_cards and not self._cancelled():
+            self.last_dedup_report["short"] = num_cards - kept
+            self._notify("warning", f"The content only gave {kept} distinct cards, "
+                                    f"{num_cards - kept} fewer than the {num_cards} requested")
     
     def _wait_for_model(self, max_wait_time: int = 60) -> bool:
         """Wait for Hugging Face model to load if it's sleeping"""
-        for attempt in range(max_wait_time // 10):
+        if self.model_type == "local":
             try:
-                test_payload = {"inputs": "Test if model is ready"}
-                response = requests.post(self.hf_api_url, headers=self.hf_headers, json=test_payload, timeout=10)
-                
-                if response.status_code == 200:
-                    return True
-                elif response.status_code == 503:
-                    st.info(f"Model is loading... Please wait (attempt {attempt + 1})")
-                    time.sleep(10)
-                else:
-                    return False
-            except requests.exceptions.Timeout:
-                st.info("Model is still loading, please wait...")
-                time.sleep(10)
+                get_local_model(self.local_checkpoint)
+                return True
+            except Exception as e:
+                self._notify("error", f"Could not load local model {self.local_checkpoint}: {str(e)}. "
+                                      "Local mode needs PyTorch and the model weights available on this machine.")
+                return False
+        
+        if self.readiness.is_ready():
+            return True
+        
+        self._notify("info", "Model is loading... Please wait")
+        return self.readiness.wait_until_ready(self._probe_model, max_wait_time, self.token_id, self.cancel_event)
+    
+    def warm_up(self):
+        """Start warming the API model in the background without blocking"""
+        if self.model_type == "huggingface" and self.hf_headers:
+            # A probe rejected for this token isn't retried until its cool-down passes
+            self.readiness.ensure_probing(self._probe_model, self.token_id)
+    
+    def _probe_model(self) -> Optional[bool]:
+        """Send one readiness probe: True if ready, None if loading, False on failure"""
+        try:
+            response = self._post_inference("Test if model is ready", timeout=10)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            self._count("readiness_probes", status="error")
+            return None
+        
+        self._count("readiness_probes", status=response.status_code)
+        if response.status_code == 200:
+            return True
+        elif response.status_code == 503:
+            return None
         return False
     
     def _generate_huggingface_flashcards(self, content: str, subject: str, num_cards: int) -> List[Dict]:
-        """Generate flashcards using Hugging Face API"""
+        """Generate flashcards using the Hugging Face API or the local model"""
+        return list(self._iter_huggingface_flashcards(content, subject, num_cards))
+    
+    def _iter_huggingface_flashcards(self, content: Union[str, _StreamedContent], subject: str, num_cards: int,
+                                     deadline: Optional[float] = None) -> Iterator[Dict]:
+        """Yield model-generated flashcards chunk by chunk, in chunk order
         
-        # Wait for model to be ready
-        if not self._wait_for_model():
-            st.error("")
-            return self._generate_offline_flashcards(content, subject, num_cards)
+        A chunk's cards are released as soon as that chunk and every chunk
+        before it have finished, so the first cards arrive after roughly one
+        chunk's latency rather than the whole deck's.
+        """
         
-        flashcards = []
+        self.last_incremental_report = None
+        self.last_deadline_report = None
+        
+        # Skip straight to offline generation while the endpoint is known to be down
+        if self.model_type == "huggingface" and self.rate_controller.breaker.is_open():
+            self._notify("warning", "The API looks unavailable right now, using offline generation")
+            yield from self._offline_fallback(_text_of(content), subject, num_cards)
+            return
+        
+        # Let a cold model warm up while the content is read and chunked
+        if self.model_type == "huggingface" and not self.readiness.is_ready():
+            self.readiness.ensure_probing(self._probe_model, self.token_id)
         
         # Split content into smaller chunks to avoid token limits
-        content_chunks = self._split_content(content, max_length=800)
-        cards_per_chunk = max(1, num_cards // len(content_chunks))
+        with self._stage("chunking"):
+            content_chunks, total_chunks = self._plan_chunks(content, num_cards)
+        content = _text_of(content)
+        # Leave time for the offline engine to top up whatever the model misses
+        model_deadline = None if deadline is None else deadline - self._offline_reserve(len(content))
+        
+        # Wait for model to be ready
+        with self._stage("readiness_wait"):
+            if model_deadline is None:
+                ready = self._wait_for_model()
+            else:
+                ready = self._wait_for_model(min(60, max(0.0, model_deadline - time.monotonic())))
+        if self._cancelled():
+            return
+        if not ready:
+            self._notify("error", "")
+            yield from self._offline_fallback(content, subject, num_cards)
+            return
+        
+        if not content_chunks:
+            yield from self._offline_fallback(content, subject, num_cards)
+            return
+        cards_per_chunk = max(1, num_cards // total_chunks)
+        packs = self._packs(cards_per_chunk)
+        self._deck_prompt_type = self._prompt_type(cards_per_chunk)
+        
+        progress = self._start_progress(f"Generating flashcards from {len(content_chunks)} chunks...")
         
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        # Unchanged chunks keep the cards the model gave them last time
+        chunk_keys = [self._chunk_key(chunk, subject, cards_per_chunk) for chunk in content_chunks]
+        memory = dict(self.chunk_memory)
+        reused = [memory.get(key) if self.incremental else None for key in chunk_keys]
+        remembered: Dict[str, List[Dict]] = {}
+        self.last_incremental_report = {
+            "reused_chunks": sum(cards is not None for cards in reused),
+            "generated_chunks": sum(cards is None for cards in reused),
+            "dropped_chunks": len(set(memory) - set(chunk_keys)),
+        }
+        if self.last_incremental_report["reused_chunks"]:
+            self._count("reused_chunks", self.last_incremental_report["reused_chunks"])
         
+        # Cards are slotted by (chunk, prompt) so completion order never changes the deck
+        chunk_prompts = [self._chunk_prompts(chunk, subject, cards_per_chunk) for chunk in content_chunks]
+        chunk_results = [[None] * len(prompts) for prompts in chunk_prompts]
+        pending = [0] * len(content_chunks)
+        use_cache = self.cache is not None and self.deterministic
+        requests_to_send = []
         for i, chunk in enumerate(content_chunks):
-            if len(flashcards) >= num_cards:
-                break
+            if reused[i] is not None:
+                continue
+            for j, (template, prompt) in enumerate(chunk_prompts[i]):
+                cache_key = self._cache_key(template, chunk, subject) if use_cache else None
+                if cache_key:
+                    cached_text = self.cache.get(cache_key)
+                    if cached_text is not None:
+                        self._count("cache_hits")
+                        chunk_results[i][j] = self._parse_slot(cached_text, chunk, packs)
+                        continue
+                requests_to_send.append(((i, j), prompt, chunk, cache_key))
+                pending[i] += 1
+        self.last_packing_report = None
+        if packs:
+            self.last_packing_report = self._packing_report(content_chunks, subject, cards_per_chunk, chunk_prompts)
+        if model_deadline is not None:
+            # Against the clock, the chunks most likely to give good cards go first
+            priorities = self._chunk_priorities(content_chunks)
+            requests_to_send.sort(key=lambda request: -priorities[request[0][0]])
+        batches = [requests_to_send[k:k + self.batch_size]
+                   for k in range(0, len(requests_to_send), self.batch_size)]
+        
+        yielded = 0
+        next_chunk = 0
+        shown_warnings = set()
+        
+        def finished_chunks():
+            """Release every leading chunk whose requests have all completed"""
+            nonlocal next_chunk
+            while next_chunk < len(content_chunks) and pending[next_chunk] == 0:
+                if reused[next_chunk] is not None:
+                    chunk_cards = reused[next_chunk]
+                    complete = True
+                else:
+                    chunk_cards = [card for cards in chunk_results[next_chunk] if cards for card in cards][:cards_per_chunk]
+                    # A slot left None failed, was hedged or ran out of time; the next run retries the chunk
+                    complete = all(cards is not None for cards in chunk_results[next_chunk])
+                if chunk_cards and complete:
+                    remembered[chunk_keys[next_chunk]] = chunk_cards
                 
-            status_text.text(f"Generating flashcards from chunk {i+1}/{len(content_chunks)}...")
-            progress_bar.progress((i + 1) / len(content_chunks))
-            
-            # Create prompts for different types of questions
-            question_types = [
-                f"Create a definition question about the key concepts in this {subject} text: {chunk}. Format: Question: [question] Answer: [answer]",
-                f"Create a 'how' or 'why' question about the processes described in this {subject} text: {chunk}. Format: Question: [question] Answer: [answer]",
-                f"Create a factual question about important details in this {subject} text: {chunk}. Format: Question: [question] Answer: [answer]"
-            ]
-            
-            chunk_cards = []
-            for question_prompt in question_types[:cards_per_chunk]:
-                try:
-                    payload = {
-                        "inputs": question_prompt,
-                        "parameters": {
-                            "max_length": 200,
-                            "temperature": 0.7,
-                            "do_sample": True
-                        }
-                    }
-                    
-                    response = requests.post(
-                        self.hf_api_url, 
-                        headers=self.hf_headers, 
-                        json=payload,
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        if isinstance(result, list) and len(result) > 0:
-                            generated_text = result[0].get('generated_text', '')
-                            card = self._parse_generated_card(generated_text, chunk)
-                            if card:
-                                chunk_cards.append(card)
+                # If HF generation didn't work well, fall back to rule-based for this chunk
+                if len(chunk_cards) == 0:
+                    if next_chunk in standby:
+                        # The model lost the race this chunk was hedged for
+                        chunk_cards = standby[next_chunk]
+                        standby_used.add(next_chunk)
+                        self._count("fallbacks")
+                        self._count("fallback_cards", len(chunk_cards))
                     else:
-                        st.warning(f"API request failed with status {response.status_code}")
-                    
-                    # Small delay to avoid rate limiting
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    st.warning(f"Error generating card: {str(e)}")
-                    continue
-            
-            # If HF generation didn't work well, fall back to rule-based for this chunk
-            if len(chunk_cards) == 0:
-                chunk_cards = self._generate_offline_flashcards(chunk, subject, cards_per_chunk)
+                        chunk_cards = self._offline_fallback(content_chunks[next_chunk], subject, cards_per_chunk)
+                
+                next_chunk += 1
+                yield from chunk_cards
+        
+        # Hedging needs to know when each request actually left the queue
+        started: Dict[int, float] = {}
+        hedge_after = self._hedge_after(cards_per_chunk)
+        hedged = set()
+        # Offline cards ready for hedged chunks, used only if the model misses the deadline
+        standby: Dict[int, List[Dict]] = {}
+        standby_used = set()
+        
+        def request_cards(batch):
+            started[id(batch)] = time.monotonic()
+            return self._request_cards(batch, model_deadline, packs)
+        
+        def release(batch):
+            for (i, _), _, _, _ in batch:
+                pending[i] -= 1
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            futures = {executor.submit(request_cards, batch): batch for batch in batches}
+            for card in finished_chunks():
+                if yielded < num_cards:
+                    yielded += 1
+                    yield card
             
-            flashcards.extend(chunk_cards)
+            done = 0
+            outstanding = set(futures)
+            while outstanding:
+                timeout = None
+                if model_deadline is not None:
+                    timeout = min(HEDGE_POLL_SECONDS, max(0.0, model_deadline - time.monotonic()))
+                elif self.cancel_event is not None:
+                    timeout = HEDGE_POLL_SECONDS
+                completed, outstanding = wait(outstanding, timeout=timeout, return_when=FIRST_COMPLETED)
+                if self._cancelled():
+                    return
+                for future in completed:
+                    slotted_cards, warning = future.result()
+                    for (i, j), card in slotted_cards:
+                        chunk_results[i][j] = card
+                    release(futures[future])
+                    if warning and warning not in shown_warnings:
+                        shown_warnings.add(warning)
+                        self._notify("warning", warning)
+                done += len(completed)
+                
+                if model_deadline is not None and outstanding:
+                    now = time.monotonic()
+                    if now >= model_deadline:
+                        # Out of time: chunks still waiting take their standby or offline
+                        # cards, and requests already running finish unobserved
+                        for future in outstanding:
+                            future.cancel()
+                            release(futures[future])
+                        done += len(outstanding)
+                        outstanding = set()
+                        self._count("deadline_hits")
+                    else:
+                        # Stragglers keep racing; their chunks get offline cards on standby
+                        for future in outstanding - hedged:
+                            batch = futures[future]
+                            if now - started.get(id(batch), now) > hedge_after:
+                                hedged.add(future)
+                                for i in {slot[0] for slot, _, _, _ in batch} - set(standby):
+                                    with self._stage("hedge_standby"):
+                                        standby[i] = self._generate_offline_flashcards(content_chunks[i], subject,
+                                                                                       cards_per_chunk)
+                progress.update(done / len(futures))
+                
+                for card in finished_chunks():
+                    if yielded < num_cards:
+                        yielded += 1
+                        yield card
+        finally:
+            # A consumer that stops early shouldn't wait on requests still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+            progress.close()
+            # Only chunks of this deck are kept, so cards of deleted chunks are dropped.
+            # Updated in place: the memory may be shared with other generators.
+            if self.incremental:
+                self.chunk_memory.clear()
+                self.chunk_memory.update(remembered)
         
-        progress_bar.empty()
-        status_text.empty()
+        if hedged:
+            self._count("hedged_requests", len(hedged))
+        if model_deadline is not None:
+            self.last_deadline_report = {"hedged_requests": len(hedged), "requests": len(batches),
+                                         "standby_chunks": len(standby_used),
+                                         "deadline_hit": time.monotonic() >= model_deadline}
         
         # If we don't have enough cards, fill with rule-based generation
-        if len(flashcards) < num_cards:
-            remaining_cards = num_cards - len(flashcards)
-            additional_cards = self._generate_offline_flashcards(content, subject, remaining_cards)
-            flashcards.extend(additional_cards)
+        if yielded < num_cards:
+            yield from self._offline_fallback(content, subject, num_cards - yielded)
+    
+    def _plan_chunks(self, content: Union[str, Iterable[str]], num_cards: int) -> Tuple[List[str], int]:
+        """Return (the chunks to generate from, total chunk count)
         
-        return flashcards[:num_cards]
+        Every chunk yields at least one card, so chunks past num_cards are
+        only counted.
+        """
+        content_chunks = []
+        total_chunks = 0
+        for total_chunks, chunk in enumerate(self._split_content(content), 1):
+            if total_chunks <= num_cards:
+                content_chunks.append(chunk)
+        return content_chunks, total_chunks
     
-    def _split_content(self, content: str, max_length: int = 800) -> List[str]:
-        """Split content into smaller chunks"""
-        sentences = content.split('.')
-        chunks = []
-        current_chunk = ""
+    def _chunk_priorities(self, content_chunks: List[str]) -> List[float]:
+        """How promising each chunk is for cards: the mean score of its best few sentences"""
+        sentences = []
+        owners = []
+        for i, chunk in enumerate(content_chunks):
+            for paragraph, _ in iter_blocks(chunk):
+                for sentence in split_sentences(paragraph):
+                    sentences.append(sentence)
+                    owners.append(i)
+        scores = self.ranker.score(sentences) if sentences else []
+        by_chunk: List[List[float]] = [[] for _ in content_chunks]
+        for owner, score in zip(owners, scores):
+            by_chunk[owner].append(float(score))
+        return [sum(sorted(chunk_scores, reverse=True)[:3]) / 3 for chunk_scores in by_chunk]
+    
+    def _hedge_after(self, cards_per_chunk: int) -> float:
+        """Seconds after which a request counts as a straggler worth hedging"""
+        mean, std, _ = self.estimator.expected(f"{self.model_type}/request/{self._prompt_type(cards_per_chunk)}",
+                                               f"{self.model_type}/request")
+        return max(1.0, mean + HEDGE_AFTER_STDS * std)
+    
+    def _offline_reserve(self, content_chars: int) -> float:
+        """Time to keep back before a deadline for the offline top-up"""
+        per_mb, std, _ = self.estimator.expected(f"{self.model_type}/fallback_per_mb", "offline/generation_per_mb")
+        return 0.05 + (per_mb + std) * content_chars / 1e6
+    
+    def _build_prompts(self, chunk: str, subject: str) -> List[str]:
+        """Create prompts for different types of questions"""
+        return [template.format(subject=subject, chunk=chunk) for template in PROMPT_TEMPLATES]
+    
+    def _chunk_prompts(self, chunk: str, subject: str, cards_per_chunk: int) -> List[Tuple[str, str]]:
+        """(template, prompt) pairs sent to the model for one chunk"""
+        if self._packs(cards_per_chunk):
+            count = min(cards_per_chunk, len(PROMPT_TEMPLATES))
+            # The count is baked into the template so it is part of the cache key
+            template = PACKED_PROMPT_TEMPLATE.replace("{count}", str(count))
+            return [(template, template.format(subject=subject, chunk=chunk))]
+        templates = PROMPT_TEMPLATES[:cards_per_chunk]
+        return [(template, template.format(subject=subject, chunk=chunk)) for template in templates]
+    
+    def _packing_report(self, content_chunks: List[str], subject: str, cards_per_chunk: int,
+                        chunk_prompts: List[List[Tuple[str, str]]]) -> Dict:
+        """Compare the prompt tokens of packed requests with one prompt per card"""
+        count_tokens = self._get_chunker().count_tokens
+        packed_prompts = [prompt for prompts in chunk_prompts for _, prompt in prompts]
+        unpacked_prompts = [prompt for chunk in content_chunks
+                            for prompt in self._build_prompts(chunk, subject)[:cards_per_chunk]]
+        packed_tokens = sum(count_tokens(packed_prompts))
+        unpacked_tokens = sum(count_tokens(unpacked_prompts))
+        return {
+            "requests": len(packed_prompts),
+            "unpacked_requests": len(unpacked_prompts),
+            "prompt_tokens": packed_tokens,
+            "unpacked_prompt_tokens": unpacked_tokens,
+            "token_savings_ratio": unpacked_tokens / packed_tokens if packed_tokens else 1.0
+        }
+    
+    def _generation_parameters(self) -> Dict:
+        """Decoding parameters sent with every generation request"""
+        if self.deterministic:
+            return {"max_length": 200, "do_sample": False}
+        return {
+            "max_length": 200,
+            "temperature": 0.7,
+            "do_sample": True
+        }
+    
+    def _chunk_key(self, chunk: str, subject: str, cards_per_chunk: int) -> str:
+        """Identify a chunk together with every setting that shapes its cards"""
+        material = json.dumps([self.endpoint_id, self._packs(cards_per_chunk), self._generation_parameters(),
+                               subject, cards_per_chunk, chunk], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    def _cache_key(self, template: str, chunk: str, subject: str) -> str:
+        """Cache key for one prompt; the subject is folded into the parameters"""
+        parameters = dict(self._generation_parameters(), subject=subject)
+        return make_cache_key(self.endpoint_id, template, chunk, parameters)
+    
+    def _post_inference(self, inputs, parameters: Dict = None, timeout: int = 30) -> requests.Response:
+        """POST to the inference endpoint over the pooled keep-alive session"""
+        payload = {"inputs": inputs}
+        if parameters:
+            payload["parameters"] = parameters
+        session = get_http_session(pool_size=max(16, self.max_concurrency))
+        return session.post(self.hf_api_url, headers=self.hf_headers, json=payload, timeout=timeout)
+    
+    def _infer_batch(self, prompts: List[str], deadline: Optional[float] = None):
+        """Run several prompts through one inference request
         
-        for sentence in sentences:
-            if len(current_chunk + sentence) < max_length:
-                current_chunk += sentence + ". "
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence + ". "
+        Returns (generated_texts, warning) where generated_texts holds one
+        entry per prompt, or None for prompts that produced nothing.
+        """
+        parameters = self._generation_parameters()
+        if self.model_type == "local":
+            model = get_local_model(self.local_checkpoint)
+            with self._stage("local_inference"):
+                generated_texts = model.generate(prompts, parameters, self.local_max_batch, self.local_threads)
+            self._count("api_calls", status="local")
+            return generated_texts, None
+        
+        # A single prompt keeps the plain string payload the endpoint has always seen
+        inputs = prompts[0] if len(prompts) == 1 else prompts
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        response, warning = self._post_with_retries(inputs, parameters, deadline)
+        if response is None:
+            return [None] * len(prompts), warning
+        if response.status_code != 200:
+            return [None] * len(prompts), f"API request failed with status {response.status_code}"
+        self.readiness.mark_ready()
         
-        return chunks if chunks else [content[:max_length]]
+        result = response.json()
+        if not isinstance(result, list) or len(result) == 0:
+            return [None] * len(prompts), None
+        if len(prompts) == 1:
+            result = [result]
+        if len(result) != len(prompts):
+            return [None] * len(prompts), f"API returned {len(result)} results for {len(prompts)} prompts"
+        
+        generated_texts = []
+        for item in result:
+            # Batched responses nest one list of generations per input
+            if isinstance(item, list):
+                item = item[0] if item else {}
+            generated_texts.append(item.get('generated_text', '') if isinstance(item, dict) else None)
+        return generated_texts, None
+    
+    def _post_with_retries(self, inputs, parameters: Dict, deadline: Optional[float] = None):
+        """POST through the adaptive rate controller, retrying throttling and server errors
+        
+        Returns (response, warning). response is None when the call was
+        abandoned: the circuit breaker is open, retries or the shared retry
+        budget ran out, deadline passed or the generation was cancelled. Client errors are returned
+        without retrying. A 429 or a "model loading" 503 doesn't count as a
+        breaker failure, and during the half-open trial it releases the trial:
+        the endpoint answered.
+        """
+        controller = self.rate_controller
+        attempt = 0
+        while True:
+            if not controller.breaker.allow_request():
+                return None, "The API looks unavailable right now, using offline generation for the remaining cards"
+            try:
+                timeout = 30
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        # Running out of time is the caller's budget, not an endpoint failure
+                        return None, None
+                
+                retry_after = None
+                try:
+                    with controller.slot(self.cancel_event), self._stage("hf_request"):
+                        response = self._post_inference(inputs, parameters, timeout=timeout)
+                except Cancelled:
+                    return None, None
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                    self._count("api_calls", status="error")
+                    if deadline is not None and isinstance(e, requests.exceptions.Timeout) and timeout < 30:
+                        return None, None
+                    controller.on_failure()
+                    warning = f"Error generating card: {str(e)}"
+                else:
+                    status = response.status_code
+                    self._count("api_calls", status=status)
+                    if status == 200:
+                        controller.on_success()
+                        return response, None
+                    if status in (429, 503):
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if status == 503 and self._is_model_loading(response):
+                            # A cold start is throttling, not an outage: it mustn't trip the breaker
+                            self.readiness.mark_loading()
+                            retry_after = retry_after or self._estimated_load_time(response)
+                        elif status == 503:
+                            controller.on_failure()
+                        controller.on_throttle(retry_after)
+                    elif status >= 500:
+                        controller.on_failure()
+                    else:
+                        # Client errors (bad token, bad payload) won't improve with a retry
+                        return response, None
+                    warning = f"API request failed with status {status}"
+            finally:
+                # A half-open trial that was throttled, refused or abandoned must not hold the breaker
+                controller.breaker.release_trial()
+            
+            delay = controller.retry_delay(attempt, retry_after)
+            if delay is None:
+                return None, warning
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                return None, None
+            if self._pause(delay):
+                return None, None
+            attempt += 1
+    
+    def _is_model_loading(self, response: requests.Response) -> bool:
+        """Whether a 503 is the inference API's "model is currently loading" answer"""
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        return isinstance(body, dict) and ("estimated_time" in body or "loading" in str(body.get("error", "")).lower())
+    
+    def _estimated_load_time(self, response: requests.Response) -> Optional[float]:
+        """Read the estimated_time hint the inference API sends while a model loads"""
+        try:
+            estimated_time = response.json().get("estimated_time")
+        except (ValueError, AttributeError):
+            return None
+        return min(float(estimated_time), 30.0) if estimated_time else None
+    
+    def _request_cards(self, batch: List, deadline: Optional[float] = None, packed: bool = False):
+        """Generate the cards for one batch of (slot, prompt, chunk, cache_key) entries
+        
+        Runs on a worker thread and returns (slotted_cards, warning).
+        Streamlit calls are only safe on the script thread, so warnings are
+        handed back instead of being shown here.
+        """
+        try:
+            generated_texts, warning = self._infer_batch([prompt for _, prompt, _, _ in batch], deadline)
+        except Exception as e:
+            return [], f"Error generating card: {str(e)}"
+        
+        slotted_cards = []
+        for (slot, _, chunk, cache_key), generated_text in zip(batch, generated_texts):
+            if generated_text is not None:
+                if cache_key and generated_text.strip():
+                    self.cache.put(cache_key, generated_text)
+                slotted_cards.append((slot, self._parse_slot(generated_text, chunk, packed)))
+        return slotted_cards, warning
+    
+    def _parse_slot(self, generated_text: str, chunk: str, packed: bool = False) -> List[Dict]:
+        """Parse one model response into the cards it holds; packed responses may hold several"""
+        with self._stage("parsing"):
+            if packed:
+                return self._parse_generated_cards(generated_text, chunk)
+            card = self._parse_generated_card(generated_text, chunk)
+            return [card] if card else []
+    
+    def _split_content(self, content: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Lazily split content into token-bounded chunks
+        
+        content may also be a stream of pieces such as the pages from
+        iter_pdf_pages, in which case chunks are produced as pages arrive.
+        """
+        return self._get_chunker().iter_chunks(content)
+    
+    def _get_chunker(self) -> TextChunker:
+        if self._chunker is None:
+            # Content-anchored boundaries keep an edit from shifting every later chunk
+            self._chunker = TextChunker(self.model_name, self.chunk_tokens, self.overlap_tokens,
+                                        anchor_every=CHUNK_ANCHOR_EVERY if self.incremental else 0)
+        return self._chunker
     
     def _parse_generated_card(self, generated_text: str, original_content: str) -> Dict:
         """Parse the generated text to extract question and answer"""
@@ -187,16 +1069,34 @@ class FlashcardGenerator:
         except Exception:
             return None
     
+    def _parse_generated_cards(self, generated_text: str, original_content: str) -> List[Dict]:
+        """Parse every Question:/Answer: pair out of a packed response"""
+        flashcards = []
+        for question, answer in _QA_PAIR.findall(generated_text):
+            if question or answer:
+                flashcards.append({
+                    "question": question if question else "What is the main concept discussed?",
+                    "answer": answer if answer else original_content[:200] + "...",
+                    "difficulty": "Medium"
+                })
+        if flashcards:
+            return flashcards
+        
+        # No pairs found: fall back to the single-card parser
+        card = self._parse_generated_card(generated_text, original_content)
+        return [card] if card else []
+    
     def _generate_offline_flashcards(self, content: str, subject: str, num_cards: int) -> List[Dict]:
         """Generate flashcards using rule-based approach (no API required)"""
         flashcards = []
         
-        # Simple rule-based flashcard generation
-        sentences = content.split('.')
-        sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
+        # Rank every sentence in the document and keep the best ones, spread across it
+        sentences, paragraph_starts = self._offline_sentences(content)
+        selected = self.ranker.select(sentences, num_cards, paragraph_starts)
         
         # Pattern-based question generation
-        for i, sentence in enumerate(sentences[:num_cards]):
+        for i in selected:
+            sentence = sentences[i]
             if ':' in sentence:
                 # Definition pattern
                 parts = sentence.split(':', 1)
@@ -208,7 +1108,7 @@ class FlashcardGenerator:
                         "answer": definition,
                         "difficulty": "Medium"
                     })
-            elif sentence.strip().endswith(')'):
+            elif sentence.strip().endswith(')') and '(' in sentence:
                 # Parenthetical information
                 base = sentence.split('(')[0].strip()
                 info = sentence.split('(')[1].replace(')', '').strip()
@@ -238,48 +1138,148 @@ class FlashcardGenerator:
         
         # Add some subject-specific questions if we need more cards
         if len(flashcards) < num_cards:
-            subject_questions = {
-                "biology": [
-                    {"question": "What biological process is described in the content?", "answer": "Refer to the main processes mentioned in the material.", "difficulty": "Hard"},
-                    {"question": "What are the key biological components discussed?", "answer": "Based on the content provided.", "difficulty": "Medium"}
-                ],
-                "history": [
-                    {"question": "What historical period or event is discussed?", "answer": "As described in the content.", "difficulty": "Medium"},
-                    {"question": "What were the key causes or effects mentioned?", "answer": "According to the material provided.", "difficulty": "Hard"}
-                ],
-                "general": [
-                    {"question": "What is the main topic discussed?", "answer": "Based on the overall content.", "difficulty": "Easy"},
-                    {"question": "What are the key points mentioned?", "answer": "As outlined in the material.", "difficulty": "Medium"}
-                ]
-            }
-            
-            additional_questions = subject_questions.get(subject.lower(), subject_questions["general"])
-            flashcards.extend(additional_questions[:num_cards - len(flashcards)])
+            additional_questions = SUBJECT_QUESTIONS.get(subject.lower(), SUBJECT_QUESTIONS["general"])
+            flashcards.extend(dict(card) for card in additional_questions[:num_cards - len(flashcards)])
         
         return flashcards[:num_cards]
     
-    def export_to_csv(self, flashcards: List[Dict]) -> str:
+    def _offline_sentences(self, content: str) -> Tuple[List[str], List[bool]]:
+        """Split content into candidate sentences, flagging those that open a paragraph"""
+        sentences = []
+        paragraph_starts = []
+        # A repeated sentence would only give the same card again
+        seen = set()
+        for block, _ in iter_blocks(content):
+            # List markers aren't part of the fact ("2. Mitochondria: ...")
+            block = re.sub(r"^(?:[-*•]|\d+[.)])\s+", "", block)
+            for position, sentence in enumerate(split_sentences(block)):
+                sentence = sentence.strip().rstrip('.')
+                if len(sentence) > 20 and sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append(sentence)
+                    paragraph_starts.append(position == 0)
+        return sentences, paragraph_starts
+    
+    def export_to_csv(self, flashcards: Iterable[Dict]) -> str:
         """Export flashcards to CSV format"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Question', 'Answer', 'Difficulty'])
-        
-        for card in flashcards:
-            writer.writerow([card['question'], card['answer'], card.get('difficulty', 'Medium')])
-        
-        return output.getvalue()
+        with self._stage("export", format="csv"):
+            return "".join(iter_csv(flashcards))
     
-    def export_to_json(self, flashcards: List[Dict]) -> str:
+    def export_to_json(self, flashcards: Iterable[Dict]) -> str:
         """Export flashcards to JSON format"""
-        return json.dumps(flashcards, indent=2)
+        with self._stage("export", format="json"):
+            return "".join(iter_json(flashcards))
     
-    def export_to_anki(self, flashcards: List[Dict]) -> str:
-        """Export flashcards to Anki-compatible format"""
-        output = []
-        for card in flashcards:
-            # Anki format: Front; Back; Tags
-            output.append(f"{card['question']};{card['answer']};{card.get('difficulty', 'Medium')}")
-        return "\n".join(output)
+    def export_to_anki(self, flashcards: Iterable[Dict]) -> str:
+        """Export flashcards to Anki's text import format"""
+        with self._stage("export", format="anki"):
+            return "".join(iter_anki_text(flashcards))
+    
+    def export_to_apkg(self, flashcards: Iterable[Dict], deck_name: str = "Flashcards") -> bytes:
+        """Export flashcards as an Anki package (.apkg)"""
+        output = io.BytesIO()
+        with self._stage("export", format="apkg"):
+            write_apkg(flashcards, output, deck_name)
+        return output.getvalue()
+
+@st.cache_resource
+def get_generation_cache() -> GenerationCache:
+    """Process-wide generation cache shared by every Streamlit session"""
+    return GenerationCache()
+
+@st.cache_resource
+def get_deck_store() -> DeckStore:
+    """Process-wide deck library shared by every Streamlit session"""
+    return DeckStore()
+
+def get_session_generator(api_key: str, model_type: str, **options) -> FlashcardGenerator:
+    """Return this session's generator, rebuilding it only when the configuration changes"""
+    config = (api_key, model_type, tuple(sorted((name, id(value) if name == "cache" else value)
+                                                for name, value in options.items())))
+    if st.session_state.get("generator_config") != config:
+        st.session_state.generator = FlashcardGenerator(api_key, model_type, **options)
+        st.session_state.generator_config = config
+        st.session_state.generator_args = (api_key, model_type, options)
+    return st.session_state.generator
+
+def build_job_generator(generator: FlashcardGenerator) -> FlashcardGenerator:
+    """A fresh generator configured like the session's one, for a single background job
+    
+    The job thread then has its own listener, metrics and last_* reports
+    while the script thread keeps using the session generator; only the
+    incremental chunk memory is shared.
+    """
+    api_key, model_type, options = st.session_state.generator_args
+    return FlashcardGenerator(api_key, model_type, chunk_memory=generator.chunk_memory, **options)
+
+def get_uploaded_content(generator: FlashcardGenerator, uploaded_file) -> str:
+    """Extract the text of an uploaded file once and reuse it on later reruns"""
+    page_range = None
+    if uploaded_file.type == "application/pdf":
+        page_range = select_pdf_pages(uploaded_file)
+    
+    upload_key = (uploaded_file.file_id, page_range)
+    if st.session_state.get("uploaded_file_key") != upload_key:
+        content = ""
+        if uploaded_file.type == "text/plain":
+            content = str(uploaded_file.read(), "utf-8")
+        elif uploaded_file.type == "application/pdf":
+            content = extract_pdf_with_progress(generator, uploaded_file, page_range)
+        st.session_state.uploaded_content = content
+        st.session_state.uploaded_file_key = upload_key
+    return st.session_state.uploaded_content
+
+def select_pdf_pages(uploaded_file) -> Optional[Tuple[int, int]]:
+    """Let the user restrict extraction to a page range of a multi-page PDF"""
+    if st.session_state.get("page_count_file_id") != uploaded_file.file_id:
+        try:
+            st.session_state.page_count = count_pdf_pages(uploaded_file)
+        except Exception:
+            st.session_state.page_count = 0
+        st.session_state.page_count_file_id = uploaded_file.file_id
+    
+    page_count = st.session_state.page_count
+    if page_count <= 1:
+        return None
+    return st.slider("Pages to extract", 1, page_count, (1, page_count))
+
+def extract_pdf_with_progress(generator: FlashcardGenerator, uploaded_file, page_range: Optional[Tuple[int, int]]) -> str:
+    """Stream pages out of a PDF, reporting progress as each page arrives"""
+    first, last = page_range if page_range else (1, max(1, st.session_state.get("page_count", 1)))
+    progress_bar = st.progress(0, text="Extracting PDF text...")
+    pages = []
+    try:
+        for pages_done, page in enumerate(generator.iter_pdf_pages(uploaded_file, page_range), 1):
+            pages.append(page)
+            progress_bar.progress(min(1.0, pages_done / (last - first + 1)),
+                                  text=f"Extracted page {first + pages_done - 1} of {last}")
+    except Exception as e:
+        st.error(f"Error reading PDF: {str(e)}")
+    progress_bar.empty()
+    return "".join(page + "\n" for page in pages)
+
+def lazy_export(exports: Dict, export_format: str, write_fn, flashcards: List[Dict]):
+    """Wrap an exporter so it runs on first download and is memoized for the deck
+    
+    write_fn streams the export into a binary file. The result is kept in a
+    spooled temporary file, so large exports live on disk rather than in
+    session state. exports is the per-deck-version dict from session state;
+    it is replaced whenever a new deck is generated. The callable runs off
+    the script thread, so it must not touch st.session_state itself.
+    """
+    lock = exports.setdefault("_lock", threading.Lock())
+    
+    def build():
+        with lock:
+            if export_format not in exports:
+                spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+                with get_metrics().time("export", format=export_format):
+                    write_fn(flashcards, spool)
+                exports[export_format] = spool
+            spool = exports[export_format]
+            spool.seek(0)
+            return spool.read()
+    return build
 
 def main():
     st.set_page_config(
@@ -298,7 +1298,7 @@ def main():
         # Model selection
         model_type = st.selectbox(
             "Choose AI Model",
-            ["HuggingFace API (Requires API Key)", "Offline Mode (No API Required)"],
+            ["HuggingFace API (Requires API Key)", "Local Model (On-Prem CPU)", "Offline Mode (No API Required)"],
             help="Select your preferred method for generating flashcards"
         )
         
@@ -316,6 +1316,8 @@ def main():
                 st.markdown("🔗 [Get your free API token here](https://huggingface.co/settings/tokens)")
             else:
                 st.success("✅ API key provided! Using google/flan-t5-large model")
+        elif "Local Model" in model_type:
+            st.info("🖥️ Local mode runs the model on this machine - no API key or network needed!")
         else:
             st.info("📝 Offline mode uses rule-based generation - no API key needed!")
         
@@ -329,13 +1331,96 @@ def main():
         # Number of flashcards
         num_cards = st.slider("Number of Flashcards", 5, 20, 10)
         
+        # Parallelism for API requests
+        max_concurrency = 4
+        batch_size = 4
+        if "HuggingFace API" in model_type:
+            max_concurrency = st.slider("Max Parallel Requests", 1, 8, 4,
+                                        help="Number of API requests allowed in flight at once")
+            batch_size = st.slider("Prompts per Request", 1, 8, 4,
+                                   help="Number of prompts packed into each batched API request")
+        
+        # Local model settings
+        local_options = {}
+        if "Local Model" in model_type:
+            local_options["local_checkpoint"] = st.text_input(
+                "Model Checkpoint", "google/flan-t5-large",
+                help="Hugging Face id or local path of a pre-downloaded seq2seq checkpoint"
+            )
+            cpu_count = os.cpu_count() or 1
+            local_options["local_threads"] = st.slider("CPU Threads", 1, max(2, cpu_count), cpu_count)
+            local_options["local_max_batch"] = st.slider("Max Batch Size", 1, 32, 8,
+                                                         help="Prompts run through each generate call")
+        
+        packed = False
+        if "Offline Mode" not in model_type:
+            packed = st.checkbox(
+                "Packed prompts",
+                help="Ask for all of a chunk's cards in one prompt so the chunk text is sent only once"
+            )
+        
+        deterministic = False
+        if "Offline Mode" not in model_type:
+            deterministic = st.checkbox(
+                "Deterministic (cached) mode",
+                help="Use greedy decoding and reuse cached generations for content seen before"
+            )
+            if deterministic:
+                cache_stats = get_generation_cache().stats()
+                st.caption(f"Cache: {cache_stats['entries']} entries, "
+                           f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
+        
+        time_limit = 0
+        if "Offline Mode" not in model_type:
+            time_limit = st.slider(
+                "Time Limit (seconds)", 0, 120, 0, step=5,
+                help="Finish within this time, filling in what the model hasn't delivered with "
+                     "rule-based cards. 0 waits for the model."
+            )
+        
         # Model information
         if "HuggingFace API" in model_type:
             st.info("🤖 **Model:** Google Flan-T5 Large\n📊 **Quality:** High\n⚡ **Speed:** Medium")
+        
+        show_metrics = st.checkbox("Show generation metrics",
+                                   help="Per-stage timings, API calls and fallbacks for the last deck")
+        metrics_panel = st.empty()
+    
+    # Initialize generator (reused across reruns while the configuration is unchanged)
+    if "HuggingFace API" in model_type:
+        selected_model = "huggingface"
+    elif "Local Model" in model_type:
+        selected_model = "local"
+    else:
+        selected_model = "offline"
+    generator = get_session_generator(api_key, selected_model,
+                                      max_concurrency=max_concurrency, batch_size=batch_size,
+                                      cache=get_generation_cache() if deterministic else None,
+                                      deterministic=deterministic, packed=packed, **local_options)
     
-    # Initialize generator
-    selected_model = "huggingface" if "HuggingFace API" in model_type else "offline"
-    generator = FlashcardGenerator(api_key, selected_model)
+    # Serves /metrics when FLASHCARD_METRICS_PORT is set; a no-op otherwise
+    start_metrics_server()
+    if show_metrics:
+        render_metrics_panel(metrics_panel)
+    
+    # Start warming the model while the user prepares their content
+    generator.warm_up()
+    if selected_model == "huggingface" and api_key:
+        with st.sidebar:
+            model_state = generator.readiness.state
+            if generator.readiness.is_ready():
+                st.caption("🟢 Model is warm")
+            elif generator.readiness.is_rejected(generator.token_id):
+                st.caption("🔴 The API refused the readiness check; please check your API token")
+            elif model_state == "loading":
+                st.caption("🟡 Model is loading in the background...")
+            else:
+                st.caption(f"⚪ Model state: {model_state}")
+            
+            rate_state = generator.rate_controller.snapshot()
+            st.caption(f"API circuit: {rate_state['breaker_state']} · "
+                       f"{rate_state['rate_per_second']:.1f} req/s · "
+                       f"limit {rate_state['concurrency_limit']:.1f} in flight")
     
     # Main content area
     col1, col2 = st.columns([2, 1])
@@ -366,10 +1451,7 @@ def main():
             )
             
             if uploaded_file is not None:
-                if uploaded_file.type == "text/plain":
-                    content = str(uploaded_file.read(), "utf-8")
-                elif uploaded_file.type == "application/pdf":
-                    content = generator.extract_text_from_pdf(uploaded_file)
+                content = get_uploaded_content(generator, uploaded_file)
                 
                 if content:
                     st.success(f"File uploaded successfully! Content length: {len(content)} characters")
@@ -383,15 +1465,33 @@ def main():
             st.metric("Estimated Words", f"{len(content.split())} words")
             st.metric("Target Flashcards", num_cards)
             
-            # Show estimated time for HF API
-            if "HuggingFace API" in model_type and api_key:
-                estimated_time = num_cards * 2  # rough estimate
-                st.metric("Est. Generation Time", f"{estimated_time}s")
+            # Predicted from the chunk plan and the latencies measured on earlier decks
+            if "HuggingFace API" not in model_type or api_key:
+                estimate = get_time_estimate(generator, content, subject, num_cards)
+                breakdown = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in estimate["breakdown"].items())
+                st.metric("Est. Generation Time", format_duration(estimate["seconds"]),
+                          help=f"Up to {format_duration(estimate['high_seconds'])}. {breakdown}")
         else:
             st.info("Upload content to see stats")
     
+    # A deck already generated from this content with these settings can be reloaded instead
+    store = get_deck_store()
+    saved = store.find_deck(content_hash(content), subject, selected_model, num_cards) if content else None
+    if saved:
+        saved_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(saved["created_at"]))
+        st.info(f"💾 A {saved['card_count']}-card deck for this content was saved on {saved_at}.")
+        if st.button("📂 Load saved deck", use_container_width=True):
+            show_saved_deck(store, saved["id"], subject)
+    
+    # A running job survives reruns via session state and page reloads via the URL
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    job = get_job_queue().get(job_id)
+    if job_id and job is None:
+        forget_job()
+    
     # Generate flashcards
-    if st.button("🚀 Generate Flashcards", type="primary", use_container_width=True):
+    if st.button("🚀 Generate Flashcards", type="primary", use_container_width=True,
+                 disabled=job is not None and not job.finished):
         if not content:
             st.error("Please provide some educational content first!")
             return
@@ -405,92 +1505,381 @@ def main():
             st.error("Please provide a HuggingFace API token or switch to Offline Mode.")
             return
         
-        generation_method = "AI-powered HuggingFace analysis" if "HuggingFace API" in model_type else "rule-based extraction"
-        with st.spinner(f"Generating flashcards using {generation_method}..."):
-            flashcards = generator.generate_flashcards(content, subject, num_cards)
-        
-        if flashcards:
-            st.success(f"Successfully generated {len(flashcards)} flashcards!")
-            
-            # Store in session state
-            st.session_state.flashcards = flashcards
-            
-            # Display flashcards
-            st.header("📚 Generated Flashcards")
-            
-            # Display options
-            display_mode = st.radio("Display Mode:", ["Card View", "List View"], horizontal=True)
-            
-            if display_mode == "Card View":
-                # Card view with tabs
-                if len(flashcards) > 0:
-                    # Create tabs for each flashcard (limit to 10 for UI performance)
-                    display_count = min(len(flashcards), 10)
-                    tab_labels = [f"Card {i+1}" for i in range(display_count)]
-                    tabs = st.tabs(tab_labels)
-                    
-                    for i, tab in enumerate(tabs):
-                        with tab:
-                            card = flashcards[i]
-                            st.markdown(f"**Question:** {card['question']}")
-                            with st.expander("Show Answer"):
-                                st.markdown(f"**Answer:** {card['answer']}")
-                                if 'difficulty' in card:
-                                    difficulty_color = {
-                                        'Easy': 'green',
-                                        'Medium': 'orange', 
-                                        'Hard': 'red'
-                                    }.get(card['difficulty'], 'blue')
-                                    st.markdown(f"**Difficulty:** :{difficulty_color}[{card['difficulty']}]")
-                    
-                    if len(flashcards) > 10:
-                        st.info(f"Showing first 10 cards. Total generated: {len(flashcards)}. Use List View or export to see all cards.")
+        # Generation runs on the shared job pool so this script thread stays responsive
+        try:
+            job = get_job_queue().submit(
+                generation_job(build_job_generator(generator), content, subject, num_cards, time_limit, store),
+                owner=get_session_owner(), total=num_cards)
+        except QueueFull as e:
+            st.warning(str(e))
+            return
+        st.session_state.job_id = job.id
+        st.query_params["job"] = job.id
+        st.session_state.job_subject = subject
+        st.session_state.job_method = {
+            "huggingface": "AI-powered HuggingFace analysis",
+            "local": "the local model"
+        }.get(selected_model, "rule-based extraction")
+    
+    if job is not None:
+        render_job(job.id)
+    
+    for level, message in st.session_state.pop("deck_notes", []):
+        getattr(st, level)(message)
+    
+    if st.session_state.get("flashcards"):
+        render_deck(generator, st.session_state.flashcards, st.session_state.deck_subject)
+    
+    render_library(store)
+
+def get_session_owner() -> str:
+    """Stable id for this browser session, used to cap its queued jobs"""
+    if "session_owner" not in st.session_state:
+        st.session_state.session_owner = uuid.uuid4().hex
+    return st.session_state.session_owner
+
+def generation_job(generator: FlashcardGenerator, content: str, subject: str, num_cards: int,
+                   time_limit: float = 0, store: Optional[DeckStore] = None):
+    """Work function for the job queue: generate a deck into the job, stopping early on cancel
+    
+    generator must belong to this job alone (see build_job_generator).
+    A time_limit counts from when the job leaves the queue. A finished
+    deck is saved to store, if given; cancelled ones are not.
+    """
+    def work(job: Job) -> Dict:
+        generator.listener = job
+        generator.cancel_event = job.cancel_event
+        deadline = time.monotonic() + time_limit if time_limit else None
+        flashcards = generator.iter_flashcards(content, subject, num_cards, deadline)
+        try:
+            for card in flashcards:
+                job.add_card(card)
+                if job.cancelled:
+                    break
+        finally:
+            flashcards.close()
+        result = {"notes": generation_notes(generator), "deck_metrics": generator.last_deck_metrics}
+        if store is not None and job.cards and not job.cancelled:
+            result["deck_id"] = store.save_deck(job.cards, content_hash(content), subject,
+                                                generator.model_type, num_cards)
+            result["notes"].append("Saved to the deck library")
+        return result
+    return work
+
+def generation_notes(generator: FlashcardGenerator) -> List[str]:
+    """Captions describing how the last deck was produced"""
+    notes = []
+    incremental = generator.last_incremental_report
+    if incremental and incremental["reused_chunks"]:
+        notes.append(f"Reused cards from {incremental['reused_chunks']} unchanged chunks; "
+                     f"regenerated {incremental['generated_chunks']}")
+    deadline = generator.last_deadline_report
+    if deadline and deadline["standby_chunks"]:
+        reason = "Hit the time limit" if deadline["deadline_hit"] else "Some model requests were slow"
+        notes.append(f"{reason}: {deadline['standby_chunks']} chunks got rule-based cards "
+                     f"in place of late model answers")
+    elif deadline and deadline["hedged_requests"]:
+        notes.append(f"{deadline['hedged_requests']} of {deadline['requests']} model requests ran slow "
+                     f"but finished in time")
+    if generator.last_dedup_report and generator.last_dedup_report["dropped"]:
+        notes.append(f"Removed {generator.last_dedup_report['dropped']} near-duplicate cards")
+    if generator.last_dedup_report and generator.last_dedup_report.get("short"):
+        notes.append(f"The deck is {generator.last_dedup_report['short']} cards short: "
+                     f"the content has too little distinct material")
+    if generator.packed and generator.last_packing_report:
+        report = generator.last_packing_report
+        notes.append(f"Packed prompts sent {report['prompt_tokens']} prompt tokens in {report['requests']} "
+                     f"requests instead of {report['unpacked_prompt_tokens']} in {report['unpacked_requests']} "
+                     f"({report['token_savings_ratio']:.1f}x fewer)")
+    return notes
+
+def forget_job():
+    st.session_state.pop("job_id", None)
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_job(job_id: str):
+    """Poll a background job: progress, cards so far and a cancel button, then hand over the deck"""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        forget_job()
+        return
+    state = job.snapshot()
+    
+    if job.finished:
+        forget_job()
+        cards = state["cards"]
+        notes = [(message["level"], message["message"]) for message in state["messages"]]
+        if state["status"] == "failed":
+            notes.append(("error", f"Generation failed: {state['error']}"))
+        elif cards:
+            if state["status"] == "cancelled":
+                notes.append(("warning", f"Generation cancelled; kept the {len(cards)} cards made so far"))
             else:
-                # List view
-                for i, card in enumerate(flashcards, 1):
-                    with st.container():
-                        st.markdown(f"### Card {i}")
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.markdown(f"**Q:** {card['question']}")
-                            st.markdown(f"**A:** {card['answer']}")
-                        with col2:
-                            if 'difficulty' in card:
-                                st.markdown(f"**Difficulty:** {card['difficulty']}")
-                        st.divider()
-            
-            # Export options
-            st.header("📥 Export Options")
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                csv_data = generator.export_to_csv(flashcards)
-                st.download_button(
-                    label="📄 Download CSV",
-                    data=csv_data,
-                    file_name=f"flashcards_{subject.lower()}.csv",
-                    mime="text/csv"
-                )
-            
-            with col2:
-                json_data = generator.export_to_json(flashcards)
-                st.download_button(
-                    label="📋 Download JSON",
-                    data=json_data,
-                    file_name=f"flashcards_{subject.lower()}.json",
-                    mime="application/json"
-                )
-            
-            with col3:
-                anki_data = generator.export_to_anki(flashcards)
-                st.download_button(
-                    label="🎯 Download Anki Format",
-                    data=anki_data,
-                    file_name=f"flashcards_{subject.lower()}.txt",
-                    mime="text/plain"
+                notes.append(("success", f"Successfully generated {len(cards)} flashcards!"))
+            notes.extend(("caption", note) for note in state["result"].get("notes", []))
+            st.session_state.deck_metrics = state["result"].get("deck_metrics")
+            # Store in session state so widget reruns render the deck without regenerating
+            st.session_state.flashcards = cards
+            st.session_state.deck_subject = st.session_state.get("job_subject", "General")
+            st.session_state.deck_version = st.session_state.get("deck_version", 0) + 1
+            st.session_state.deck_exports = {}
+        elif state["status"] == "cancelled":
+            notes.append(("info", "Generation cancelled"))
+        else:
+            notes.append(("error", "Failed to generate flashcards. Please try again or switch to Offline Mode."))
+        st.session_state.deck_notes = notes
+        st.rerun()
+    
+    method = st.session_state.get("job_method", "the selected model")
+    if state["status"] == "queued":
+        ahead = queue.position(job)
+        st.info(f"Waiting for a free worker ({ahead} deck{'s' if ahead != 1 else ''} ahead)...")
+    else:
+        fraction = max(state["progress_fraction"], len(state["cards"]) / max(state["total"], 1))
+        st.progress(min(fraction, 1.0), text=state["progress_text"] or f"Generating flashcards using {method}...")
+    for message in state["messages"]:
+        getattr(st, message["level"])(message["message"])
+    
+    if job.cancelled:
+        st.caption("Cancelling...")
+    elif st.button("Cancel generation", key=f"cancel_{job_id}"):
+        job.cancel()
+        st.caption("Cancelling...")
+    
+    # Show cards as they arrive instead of waiting for the whole deck
+    if state["cards"]:
+        st.subheader("Cards so far")
+        st.markdown("\n\n".join(f"**{i}.** {card['question']}" for i, card in enumerate(state["cards"], 1)))
+
+def get_time_estimate(generator: FlashcardGenerator, content: str, subject: str, num_cards: int) -> Dict:
+    """Estimate generation time once per content/settings combination instead of on every rerun"""
+    # A new deck changes what the incremental memory and the cache already cover
+    key = (content_hash(content), subject, num_cards, st.session_state.get("generator_config"),
+           generator.readiness.is_ready(), st.session_state.get("deck_version"))
+    if st.session_state.get("time_estimate_key") != key:
+        st.session_state.time_estimate = generator.estimate_generation_time(content, subject, num_cards)
+        st.session_state.time_estimate_key = key
+    return st.session_state.time_estimate
+
+def show_saved_deck(store: DeckStore, deck_id: int, subject: str):
+    """Make a deck from the library the current deck, as if it had just been generated"""
+    deck = store.load_deck(deck_id)
+    if not deck:
+        st.warning("That deck is no longer in the library")
+        return
+    st.session_state.flashcards = deck
+    st.session_state.deck_subject = subject
+    st.session_state.deck_version = st.session_state.get("deck_version", 0) + 1
+    st.session_state.deck_exports = {}
+    st.session_state.deck_notes = [("success", f"Loaded {len(deck)} saved flashcards")]
+
+def render_library(store: DeckStore):
+    """Search the cards of every saved deck and reload whole decks"""
+    stats = store.stats()
+    with st.expander(f"🗄️ Deck Library ({stats['decks']} deck{'s' if stats['decks'] != 1 else ''}, "
+                     f"{stats['cards']} cards)"):
+        if not stats["decks"]:
+            st.caption("Generated decks are saved here so they can be searched and reloaded")
+            return
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            query = st.text_input("Search cards", placeholder="e.g. chloroplast", key="library_query")
+        with col2:
+            subjects = sorted({deck["subject"] for deck in store.list_decks(limit=1000)})
+            subject = st.selectbox("Subject", ["All"] + subjects, key="library_subject")
+        with col3:
+            difficulty = st.selectbox("Difficulty", ["All", "Easy", "Medium", "Hard"], key="library_difficulty")
+        subject = None if subject == "All" else subject
+        difficulty = None if difficulty == "All" else difficulty
+        
+        if query or subject or difficulty:
+            matches = store.search(query, subject=subject, difficulty=difficulty, limit=LIBRARY_RESULTS)
+            st.caption(f"{len(matches)}{'+' if len(matches) == LIBRARY_RESULTS else ''} matching cards")
+            if matches:
+                st.dataframe(
+                    [{"Question": card["question"], "Answer": card["answer"], "Difficulty": card["difficulty"],
+                      "Subject": card["subject"], "Deck": card["deck_id"]} for card in matches],
+                    hide_index=True, width="stretch"
                 )
+        
+        decks = store.list_decks(subject)
+        labels = {deck["id"]: f"#{deck['id']} · {deck['subject']} · {deck['card_count']} cards · {deck['backend']} · "
+                              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(deck['created_at']))}"
+                  for deck in decks}
+        deck_id = st.selectbox("Saved decks", list(labels), format_func=labels.get, key="library_deck")
+        if deck_id is not None and st.button("📂 Load deck", key="library_load"):
+            show_saved_deck(store, deck_id, next(deck["subject"] for deck in decks if deck["id"] == deck_id))
+            st.rerun()
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return "<1s"
+    if seconds < 90:
+        return f"~{seconds:.0f}s"
+    return f"~{seconds / 60:.1f} min"
+
+def render_metrics_panel(placeholder):
+    """Show the last deck's stage timings and counters in a sidebar placeholder"""
+    deck = st.session_state.get("deck_metrics")
+    with placeholder.container():
+        st.subheader("📈 Generation Metrics")
+        if not deck:
+            st.caption("Generate a deck to see where the time goes")
+            return
+        st.caption(f"{deck['cards']} cards in {deck['total_seconds']:.2f}s · "
+                   f"{deck['api_calls']} API calls · {deck['fallbacks']} fallbacks "
+                   f"({deck['fallback_cards']} cards)")
+        st.dataframe(
+            [{"Stage": stage, "Seconds": round(timing["seconds"], 3), "Runs": timing["runs"]}
+             for stage, timing in sorted(deck["stages"].items(), key=lambda item: -item[1]["seconds"])],
+            hide_index=True, width="stretch"
+        )
+
+def filter_deck(flashcards: List[Dict], query: str, difficulties: List[str]) -> List[int]:
+    """Indices of the cards matching every word of query and one of difficulties
+    
+    The result is kept in session state until the deck or the filters
+    change, so paging through a filtered deck doesn't scan it again.
+    """
+    key = (st.session_state.get("deck_version"), query.strip().lower(), tuple(difficulties))
+    if st.session_state.get("deck_filter_key") != key:
+        words = key[1].split()
+        if isinstance(flashcards, Deck):
+            rows = flashcards.rows()
         else:
-            st.error("Failed to generate flashcards. Please try again or switch to Offline Mode.")
+            rows = ((card["question"], card["answer"], card.get("difficulty")) for card in flashcards)
+        st.session_state.deck_filter = [
+            i for i, (question, answer, difficulty) in enumerate(rows)
+            if (not difficulties or difficulty in difficulties)
+            and all(word in question.lower() or word in answer.lower() for word in words)
+        ]
+        st.session_state.deck_filter_key = key
+        # New results start from the top
+        st.session_state.card_position = 0
+        st.session_state.deck_page = 1
+    return st.session_state.deck_filter
+
+def card_markdown(flashcards: List[Dict], index: int) -> Tuple[str, str, str]:
+    """(question, answer, difficulty) markdown for one card, built once per deck"""
+    version, cache = st.session_state.get("deck_markdown", (None, None))
+    if version != st.session_state.get("deck_version"):
+        cache = {}
+        st.session_state.deck_markdown = (st.session_state.get("deck_version"), cache)
+    if index not in cache:
+        card = flashcards[index]
+        difficulty = card.get("difficulty")
+        cache[index] = (
+            f"**Question:** {card['question']}",
+            f"**Answer:** {card['answer']}",
+            f"**Difficulty:** :{DIFFICULTY_COLORS.get(difficulty, 'blue')}[{difficulty}]" if difficulty else ""
+        )
+    return cache[index]
+
+def move_card(step: int, count: int):
+    st.session_state.card_position = (st.session_state.get("card_position", 0) + step) % count
+
+def render_card_view(flashcards: List[Dict], matches: List[int]):
+    """One card at a time with previous/next buttons, whatever the size of the deck"""
+    position = min(st.session_state.get("card_position", 0), len(matches) - 1)
+    st.session_state.card_position = position
+    index = matches[position]
+    
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        st.button("◀ Previous", on_click=move_card, args=(-1, len(matches)), use_container_width=True)
+    with col2:
+        st.caption(f"Card {position + 1} of {len(matches)}"
+                   + (f" (card {index + 1} of the deck)" if len(matches) != len(flashcards) else ""))
+    with col3:
+        st.button("Next ▶", on_click=move_card, args=(1, len(matches)), use_container_width=True)
+    
+    question, answer, difficulty = card_markdown(flashcards, index)
+    st.markdown(question)
+    with st.expander("Show Answer"):
+        st.markdown(f"{answer}\n\n{difficulty}")
+
+def render_list_view(flashcards: List[Dict], matches: List[int]):
+    """One page of cards as a single markdown block, so render cost doesn't grow with the deck"""
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Cards per page", DECK_PAGE_SIZES, key="deck_page_size")
+    pages = max(1, math.ceil(len(matches) / page_size))
+    # A smaller result set or bigger pages may leave the current page past the end
+    if st.session_state.get("deck_page", 1) > pages:
+        st.session_state.deck_page = pages
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="deck_page")
+    start = (page - 1) * page_size
+    visible = matches[start:start + page_size]
+    with col3:
+        st.caption(f"Cards {start + 1}–{start + len(visible)} of {len(matches)}")
+    
+    st.markdown("\n\n---\n\n".join(
+        f"### Card {index + 1}\n\n" + "\n\n".join(part for part in card_markdown(flashcards, index) if part)
+        for index in visible
+    ))
+
+def render_deck(generator: FlashcardGenerator, flashcards: List[Dict], subject: str):
+    """Display the current deck and its export options"""
+    st.header("📚 Generated Flashcards")
+    
+    # Display options
+    display_mode = st.radio("Display Mode:", ["Card View", "List View"], horizontal=True)
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Search this deck", key="deck_query", placeholder="Words in the question or answer")
+    with col2:
+        difficulties = st.multiselect("Difficulty", list(DIFFICULTY_COLORS), key="deck_difficulty")
+    
+    # Only the visible card or page is built, so large decks cost the same to show as small ones
+    matches = filter_deck(flashcards, query, difficulties)
+    if not matches:
+        st.info("No cards match the search")
+    elif display_mode == "Card View":
+        render_card_view(flashcards, matches)
+    else:
+        render_list_view(flashcards, matches)
+    
+    # Export options (built on first download, then reused until the deck changes)
+    st.header("📥 Export Options")
+    exports = st.session_state.deck_exports
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.download_button(
+            label="📄 Download CSV",
+            data=lazy_export(exports, "csv", lambda cards, out: write_text(iter_csv(cards), out), flashcards),
+            file_name=f"flashcards_{subject.lower()}.csv",
+            mime="text/csv"
+        )
+    
+    with col2:
+        st.download_button(
+            label="📋 Download JSON",
+            data=lazy_export(exports, "json", lambda cards, out: write_text(iter_json(cards), out), flashcards),
+            file_name=f"flashcards_{subject.lower()}.json",
+            mime="application/json"
+        )
+    
+    with col3:
+        st.download_button(
+            label="🎯 Download Anki Format",
+            data=lazy_export(exports, "anki", lambda cards, out: write_text(iter_anki_text(cards), out), flashcards),
+            file_name=f"flashcards_{subject.lower()}.txt",
+            mime="text/plain"
+        )
+    
+    with col4:
+        st.download_button(
+            label="🗂️ Download Anki Package",
+            data=lazy_export(exports, "apkg",
+                             lambda cards, out: write_apkg(cards, out, f"Flashcards::{subject}"), flashcards),
+            file_name=f"flashcards_{subject.lower()}.apkg",
+            mime="application/octet-stream"
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
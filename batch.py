@@ -0,0 +1,271 @@
+"""
+Headless batch generation: turn a directory of documents into decks
+
+Walks directories (or globs) for .pdf, .txt and .md files, extracts and
+generates every file's deck in a pool of worker processes, and streams the
+results as they finish: one JSON line per card in flashcards.jsonl, or one
+export per source file. A checkpoint records every finished file with its
+content hash, so an interrupted run picks up where it stopped with --resume.
+With --store every deck is also saved to a searchable deck library.
+
+    python batch.py notes/ --output decks --model offline --workers 4
+    python batch.py "lectures/**/*.pdf" --format apkg --num-cards 20 --resume
+    python batch.py notes/ --subject Biology --store .flashcard_cache/decks.sqlite3
+    HF_API_TOKEN=hf_... python batch.py notes/ --model huggingface
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+from cards import Deck
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+CHECKPOINT_NAME = ".batch_checkpoint.jsonl"
+JSONL_NAME = "flashcards.jsonl"
+FILE_FORMATS = {"csv": ".csv", "json": ".json", "anki": ".txt", "apkg": ".apkg"}
+
+# Generator held by each worker process, set once by _init_worker
+_worker_generator = None
+
+
+def _init_worker(options: Dict):
+    """Build one generator per worker so its HTTP pool and caches are reused across files"""
+    global _worker_generator
+    from app import FlashcardGenerator, quiet_streamlit_logging
+    quiet_streamlit_logging()
+    _worker_generator = FlashcardGenerator(**options)
+
+
+def _read_document(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        from pdf_extraction import iter_pdf_pages
+        # This process is already one of the pool's workers, so parse serially
+        with _worker_generator._stage("pdf_extraction"):
+            return "".join(page + "\n" for page in iter_pdf_pages(path, workers=1))
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _generate(path: str, subject: str, num_cards: int) -> Dict:
+    """Worker task: extract one document and generate its deck"""
+    started = time.perf_counter()
+    try:
+        content = _read_document(path)
+        if len(content.strip()) < 50:
+            raise ValueError("too little text to generate from")
+        # A columnar Deck keeps the result small to hold and to send back to the parent
+        cards = _worker_generator.generate_deck(content, subject, num_cards)
+        from deck_store import content_hash
+        return {"cards": cards, "chars": len(content), "content_hash": content_hash(content),
+                "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "cards": [], "chars": 0,
+                "seconds": time.perf_counter() - started}
+
+
+def iter_documents(inputs: List[str], recursive: bool) -> Iterator[str]:
+    """Yield supported files under inputs (files, directories or glob patterns) once each, sorted"""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*") if recursive else os.path.join(item, "*")
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif os.path.isfile(item):
+            candidates = [item]
+        else:
+            candidates = glob.glob(item, recursive=True)
+        found.update(os.path.abspath(path) for path in candidates
+                     if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS))
+    yield from sorted(found)
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict]:
+    """Finished files by source path; a torn last line from a crash is ignored"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            done[entry["source"]] = entry
+    return done
+
+
+def output_name(source: str, root: str, extension: str) -> str:
+    """Flatten source's path relative to root into a file name, e.g. bio/cells.pdf -> bio__cells.csv"""
+    relative = os.path.relpath(source, root) if root else os.path.basename(source)
+    stem = os.path.splitext(relative)[0].replace(os.sep, "__")
+    return stem + extension
+
+
+def write_deck(cards: Deck, path: str, export_format: str, deck_name: str):
+    """Write one file's deck atomically in export_format"""
+    from exporters import iter_anki_text, iter_csv, iter_json, write_apkg, write_text
+    temp_path = path + ".part"
+    with open(temp_path, "wb") as out:
+        if export_format == "apkg":
+            write_apkg(cards, out, deck_name=deck_name)
+        else:
+            pieces = {"csv": iter_csv, "json": iter_json, "anki": iter_anki_text}[export_format](cards)
+            write_text(pieces, out)
+    os.replace(temp_path, path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate flashcard decks for a directory of documents")
+    parser.add_argument("inputs", nargs="+", help="directories, files or glob patterns (.pdf, .txt, .md)")
+    parser.add_argument("--recursive", "-r", action="store_true", help="walk directories recursively")
+    parser.add_argument("--output", "-o", default="decks", help="output directory (default: decks)")
+    parser.add_argument("--format", dest="export_format", default="jsonl",
+                        choices=["jsonl"] + sorted(FILE_FORMATS),
+                        help="jsonl streams every card into one file; the others write one deck per document")
+    parser.add_argument("--model", default="offline", choices=["huggingface", "local", "offline"])
+    parser.add_argument("--api-key", default=os.environ.get("HF_API_TOKEN"),
+                        help="Hugging Face token (default: $HF_API_TOKEN)")
+    parser.add_argument("--api-url", help="override the inference endpoint")
+    parser.add_argument("--subject", default="General")
+    parser.add_argument("--num-cards", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="API requests in flight per worker")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--packed", action="store_true", help="ask for all of a chunk's cards in one prompt")
+    parser.add_argument("--store", help="also save every deck to the deck library at this SQLite path")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip files the checkpoint lists as done with unchanged content")
+    args = parser.parse_args(argv)
+
+    if args.model == "huggingface" and not args.api_key:
+        parser.error("--model huggingface needs --api-key or $HF_API_TOKEN")
+
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = os.path.join(args.output, CHECKPOINT_NAME)
+    jsonl_path = os.path.join(args.output, JSONL_NAME)
+    done = load_checkpoint(checkpoint_path) if args.resume else {}
+    if not args.resume:
+        for path in (checkpoint_path, jsonl_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    sources = list(iter_documents(args.inputs, args.recursive))
+    directories = [os.path.abspath(item) for item in args.inputs if os.path.isdir(item)]
+    root = os.path.commonpath(directories) if len(directories) == 1 else None
+    pending = []
+    skipped = 0
+    for source in sources:
+        digest = file_hash(source)
+        previous = done.get(source)
+        if previous and previous["sha256"] == digest:
+            skipped += 1
+        else:
+            pending.append((source, digest))
+    print(f"{len(sources)} documents found, {skipped} already done, {len(pending)} to generate", flush=True)
+
+    jsonl = None
+    if args.export_format == "jsonl":
+        jsonl = open(jsonl_path, "ab")
+        # Drop cards written after the last checkpoint entry; their file is generated again
+        offsets = [entry.get("offset", 0) for entry in done.values()]
+        jsonl.truncate(max(offsets, default=0))
+        jsonl.seek(0, os.SEEK_END)
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+    store = None
+    if args.store:
+        from deck_store import DeckStore
+        store = DeckStore(args.store)
+
+    options = {"api_key": args.api_key, "model_type": args.model, "api_url": args.api_url,
+               "max_concurrency": args.max_concurrency, "batch_size": args.batch_size, "packed": args.packed}
+    started = time.perf_counter()
+    files = cards_total = chars_total = failed = 0
+    workers = max(1, min(args.workers, len(pending) or 1))
+    executor = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker, initargs=(options,))
+    try:
+        # Keep a bounded number of files in flight so results stream out as the run goes
+        queue = iter(pending)
+        in_flight = {}
+
+        def refill():
+            for source, digest in queue:
+                future = executor.submit(_generate, source, args.subject, args.num_cards)
+                in_flight[future] = (source, digest)
+                if len(in_flight) >= 2 * workers:
+                    break
+
+        refill()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source, digest = in_flight.pop(future)
+                result = future.result()
+                label = os.path.relpath(source, root) if root else source
+                if result.get("error"):
+                    failed += 1
+                    print(f"  failed  {label}: {result['error']}", file=sys.stderr, flush=True)
+                    continue
+
+                cards = result["cards"]
+                if jsonl is not None:
+                    jsonl.write(b"".join(
+                        json.dumps({"question": question, "answer": answer, "difficulty": difficulty,
+                                    "source": label, "subject": args.subject}, ensure_ascii=False).encode("utf-8")
+                        + b"\n" for question, answer, difficulty in cards.rows()))
+                    jsonl.flush()
+                    output = jsonl_path
+                else:
+                    output = os.path.join(args.output, output_name(source, root, FILE_FORMATS[args.export_format]))
+                    deck_name = os.path.splitext(os.path.basename(source))[0]
+                    write_deck(cards, output, args.export_format, deck_name)
+                if store is not None:
+                    store.save_deck(cards, result["content_hash"], args.subject, args.model, args.num_cards,
+                                    name=label)
+                # The checkpoint entry is written only once the cards are safely out
+                entry = {"source": source, "sha256": digest, "cards": len(cards), "output": output}
+                if jsonl is not None:
+                    entry["offset"] = jsonl.tell()
+                checkpoint.write(json.dumps(entry) + "\n")
+                checkpoint.flush()
+
+                files += 1
+                cards_total += len(cards)
+                chars_total += result["chars"]
+                print(f"  {len(cards):4d} cards  {result['seconds']:6.2f}s  {label}", flush=True)
+            refill()
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with --resume to continue", file=sys.stderr)
+        return 130
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        checkpoint.close()
+        if store is not None:
+            store.close()
+        if jsonl is not None:
+            jsonl.close()
+
+    elapsed = time.perf_counter() - started
+    rate = max(elapsed, 1e-9)
+    print(f"Done: {files} files, {cards_total} cards, {failed} failed, {skipped} skipped in {elapsed:.1f}s "
+          f"({files / rate:.2f} files/s, {cards_total / rate:.1f} cards/s, {chars_total / 1e6 / rate:.2f} MB/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
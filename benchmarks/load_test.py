@@ -0,0 +1,176 @@
+"""
+End-to-end load test of HF mode against the mock inference server
+
+Simulates N Streamlit sessions in one process: each simulated user owns a
+FlashcardGenerator pointed at the mock endpoint and generates decks back to
+back, so they share the process-wide HTTP pool, rate controller and
+readiness tracker exactly as real sessions do. For every concurrency level
+it reports p50/p95/p99 time-to-deck, HTTP requests and prompts per card,
+throttling seen by the server, and how many cards fell back to offline
+generation.
+
+    python benchmarks/load_test.py --users 1,4,16 --decks 3 --median-latency 0.5 --rate-limit 20
+    python benchmarks/load_test.py --url http://127.0.0.1:8900 --users 8   # external mock server
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+import numpy as np
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+from app import FlashcardGenerator, quiet_streamlit_logging  # noqa: E402
+from mock_inference_server import MockInferenceServer  # noqa: E402
+from run_benchmarks import make_corpus  # noqa: E402
+
+
+class CountingGenerator(FlashcardGenerator):
+    """FlashcardGenerator that counts the cards produced by offline fallback"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fallback_cards = 0
+
+    def _generate_offline_flashcards(self, content, subject, num_cards):
+        cards = super()._generate_offline_flashcards(content, subject, num_cards)
+        self.fallback_cards += len(cards)
+        return cards
+
+
+def _server_call(base_url: str, path: str, method: str = "GET") -> Dict:
+    request = urllib.request.Request(base_url + path, data=b"" if method == "POST" else None, method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def run_level(users: int, decks: int, model_url: str, base_url: str, options: Dict,
+              num_cards: int, corpus_size: int) -> Dict:
+    """Run users simulated sessions generating decks each; return the level's report"""
+    _server_call(base_url, "/reset", "POST")
+    # A fresh token per level gives each level its own rate controller and breaker
+    api_key = f"load-test-{users}-{time.time_ns()}"
+    timings: List[float] = []
+    cards_total = 0
+    fallback_total = 0
+    decks_with_fallback = 0
+    failures = 0
+    lock = threading.Lock()
+
+    def session(user: int):
+        nonlocal cards_total, fallback_total, decks_with_fallback, failures
+        generator = CountingGenerator(api_key, "huggingface", api_url=model_url, **options)
+        for deck in range(decks):
+            content = make_corpus(corpus_size, seed=user * 1000 + deck)
+            generator.fallback_cards = 0
+            started = time.perf_counter()
+            try:
+                cards = generator.generate_flashcards(content, "Biology", num_cards)
+            except Exception:
+                with lock:
+                    failures += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                timings.append(elapsed)
+                cards_total += len(cards)
+                fallback_total += min(generator.fallback_cards, len(cards))
+                decks_with_fallback += generator.fallback_cards > 0
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(user,)) for user in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    server = _server_call(base_url, "/stats")
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) if timings else (float("nan"),) * 3
+    return {
+        "users": users,
+        "decks": len(timings),
+        "failed_decks": failures,
+        "wall_seconds": round(wall, 3),
+        "decks_per_second": round(len(timings) / wall, 3),
+        "p50_seconds": round(float(p50), 3),
+        "p95_seconds": round(float(p95), 3),
+        "p99_seconds": round(float(p99), 3),
+        "cards": cards_total,
+        "requests_per_card": round(server["requests"] / max(cards_total, 1), 3),
+        "prompts_per_card": round(server["prompts"] / max(cards_total, 1), 3),
+        "fallback_rate": round(fallback_total / max(cards_total, 1), 3),
+        "decks_with_fallback": decks_with_fallback,
+        "server": server,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test HF mode against a mock inference endpoint")
+    parser.add_argument("--users", default="1,4,16", help="comma-separated concurrent session counts")
+    parser.add_argument("--decks", type=int, default=3, help="decks generated back to back per session")
+    parser.add_argument("--num-cards", type=int, default=10)
+    parser.add_argument("--corpus-size", type=int, default=8 * 1024, help="characters of notes per deck")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--packed", action="store_true")
+    parser.add_argument("--url", help="base URL of an already running mock server (default: start one)")
+    parser.add_argument("--median-latency", type=float, default=0.5)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--initial-loading", type=float, default=0.0)
+    parser.add_argument("--loading-every", type=float, default=0.0)
+    parser.add_argument("--loading-duration", type=float, default=5.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--json", dest="json_path", help="also write the reports to this file")
+    args = parser.parse_args(argv)
+
+    quiet_streamlit_logging()
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server = MockInferenceServer(median_latency=args.median_latency, latency_sigma=args.latency_sigma,
+                                     initial_loading=args.initial_loading, loading_every=args.loading_every,
+                                     loading_duration=args.loading_duration, rate_limit=args.rate_limit,
+                                     burst=args.burst, error_rate=args.error_rate, seed=0).start()
+        base_url = server.url
+    model_url = f"{base_url}/models/google/flan-t5-large"
+    options = {"max_concurrency": args.max_concurrency, "batch_size": args.batch_size, "packed": args.packed}
+
+    reports = []
+    print(f"{'users':>5} {'decks':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'decks/s':>8} "
+          f"{'req/card':>8} {'fallback':>8} {'429s':>5} {'503s':>5}")
+    try:
+        for users in (int(value) for value in args.users.split(",")):
+            report = run_level(users, args.decks, model_url, base_url, options, args.num_cards, args.corpus_size)
+            reports.append(report)
+            print(f"{users:5d} {report['decks']:5d} {report['p50_seconds']:6.2f}s {report['p95_seconds']:6.2f}s "
+                  f"{report['p99_seconds']:6.2f}s {report['decks_per_second']:8.2f} "
+                  f"{report['requests_per_card']:8.2f} {report['fallback_rate']:8.1%} "
+                  f"{report['server']['throttled_429']:5d} {report['server']['loading_503']:5d}", flush=True)
+    finally:
+        if server:
+            server.stop()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Local stand-in for the Hugging Face inference endpoint
+
+Answers POST /models/<model> like the hosted API does, with a configurable
+latency distribution, "model loading" phases that return 503 with an
+estimated_time, and a token-bucket rate limit that returns 429 with
+Retry-After. GET /stats returns request counters and POST /reset clears them.
+
+    python benchmarks/mock_inference_server.py --port 8900 --median-latency 0.8 --rate-limit 20
+
+Point a generator at it with
+FlashcardGenerator(api_key="mock", api_url="http://127.0.0.1:8900/models/google/flan-t5-large").
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+_CHUNK = re.compile(r" text: (.*?)\. (?:Format|Mix)", re.DOTALL)
+_WORD = re.compile(r"[A-Za-z][A-Za-z-]{3,}")
+
+
+class MockInferenceServer:
+    """Threaded HTTP server imitating the inference API's latency and failure modes
+
+    median_latency and latency_sigma describe a log-normal per-request
+    latency. The model starts cold for initial_loading seconds and goes
+    cold again for loading_duration seconds every loading_every seconds
+    (0 disables it). rate_limit is the sustained requests per second
+    before 429s; error_rate is the share of requests failing with a 500.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, median_latency: float = 0.5,
+                 latency_sigma: float = 0.5, initial_loading: float = 0.0, loading_every: float = 0.0,
+                 loading_duration: float = 5.0, rate_limit: float = 0.0, burst: int = 10,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.initial_loading = initial_loading
+        self.loading_every = loading_every
+        self.loading_duration = loading_duration
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._started_at = time.monotonic()
+        self.reset_stats()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._reply(200, server.stats())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path == "/reset":
+                    server.reset_stats()
+                    self._reply(200, {"ok": True})
+                elif self.path.startswith("/models/"):
+                    self._reply(*server.handle_inference(json.loads(body or b"{}")))
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def _reply(self, status: int, payload, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on this request (a timeout or a hedge)
+                    self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def model_url(self, model: str = "google/flan-t5-large") -> str:
+        return f"{self.url}/models/{model}"
+
+    def start(self) -> "MockInferenceServer":
+        """Serve on a daemon thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"requests": 0, "prompts": 0, "ok": 0, "loading_503": 0,
+                           "throttled_429": 0, "errors_500": 0}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def _loading_remaining(self) -> float:
+        """Seconds until the model is warm again, or 0 if it is warm now"""
+        elapsed = time.monotonic() - self._started_at
+        if elapsed < self.initial_loading:
+            return self.initial_loading - elapsed
+        if self.loading_every > 0:
+            phase = (elapsed - self.initial_loading) % self.loading_every
+            if phase >= self.loading_every - self.loading_duration:
+                return self.loading_every - phase
+        return 0.0
+
+    def _take_token(self) -> Optional[float]:
+        """Consume one rate-limit token; returns seconds to wait if none is left"""
+        if self.rate_limit <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.rate_limit
+
+    def handle_inference(self, payload: Dict):
+        """Return (status, body, headers) for one inference request"""
+        inputs = payload.get("inputs", "")
+        prompts = inputs if isinstance(inputs, list) else [inputs]
+        self._count(requests=1, prompts=len(prompts))
+
+        wait = self._take_token()
+        if wait is not None:
+            self._count(throttled_429=1)
+            return 429, {"error": "Rate limit reached"}, {"Retry-After": str(max(1, math.ceil(wait)))}
+
+        loading = self._loading_remaining()
+        if loading > 0:
+            self._count(loading_503=1)
+            return 503, {"error": "Model is currently loading", "estimated_time": round(loading, 1)}, None
+
+        with self._lock:
+            latency = (self._random.lognormvariate(math.log(self.median_latency), self.latency_sigma)
+                       if self.median_latency > 0 else 0.0)
+            failed = self._random.random() < self.error_rate
+        # Batched prompts cost a little more than one, as they do on a real GPU
+        time.sleep(latency * (1 + 0.1 * (len(prompts) - 1)))
+        if failed:
+            self._count(errors_500=1)
+            return 500, {"error": "Internal error"}, None
+
+        self._count(ok=1)
+        generations = [[{"generated_text": self._generate(prompt)}] for prompt in prompts]
+        if not isinstance(inputs, list):
+            return 200, generations[0], None
+        return 200, generations, None
+
+    def _generate(self, prompt: str) -> str:
+        """Fabricate a plausible card from the prompt's chunk text"""
+        match = _CHUNK.search(prompt)
+        words = _WORD.findall(match.group(1) if match else prompt)
+        if not words:
+            return "Question: What is this text about? Answer: It is a test prompt."
+        with self._lock:
+            term = self._random.choice(words)
+            answer = " ".join(self._random.choice(words) for _ in range(12))
+        return f"Question: What is the role of {term.lower()}? Answer: {answer.capitalize()}."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Hugging Face inference endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--median-latency", type=float, default=0.5, help="median seconds per request")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal shape; 0 for fixed latency")
+    parser.add_argument("--initial-loading", type=float, default=0.0, help="seconds the model starts cold")
+    parser.add_argument("--loading-every", type=float, default=0.0, help="seconds between cold phases (0 = never)")
+    parser.add_argument("--loading-duration", type=float, default=5.0, help="length of each cold phase")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before 429s (0 = none)")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    args = parser.parse_args()
+
+    server = MockInferenceServer(args.host, args.port, args.median_latency, args.latency_sigma,
+                                 args.initial_loading, args.loading_every, args.loading_duration,
+                                 args.rate_limit, args.burst, args.error_rate)
+    print(f"Mock inference endpoint at {server.model_url()}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Micro-benchmarks for the FlashcardGenerator hot paths
+
+Runs fully offline against synthetic corpora (1 KB to 10 MB of text, and
+generated multi-hundred-page PDFs), reports throughput and peak memory,
+and compares each result with the stored baseline.
+
+    python benchmarks/run_benchmarks.py                  # compare with baseline.json
+    python benchmarks/run_benchmarks.py --quick          # skip the 10 MB corpus
+    python benchmarks/run_benchmarks.py --update-baseline
+
+Timings are the best of --repeat runs. Peak memory is measured with
+tracemalloc in a separate run so it doesn't skew the timings; it only
+covers the current process, not the PDF worker processes.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Never reach out to the Hugging Face Hub; the chunker falls back to its token estimate
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import FlashcardGenerator  # noqa: E402
+from cards import Card, Deck  # noqa: E402
+from deck_store import DeckStore  # noqa: E402
+from exporters import iter_anki_text, iter_csv, iter_json, write_apkg, write_text  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+TEXT_SIZES = [("1KB", 1 << 10), ("10KB", 10 << 10), ("100KB", 100 << 10), ("1MB", 1 << 20), ("10MB", 10 << 20)]
+PDF_PAGES = [200, 500]
+EXPORT_CARDS = [1000, 20000]
+# Deck sizes for the card-representation memory benchmarks
+DECK_CARDS = [100000]
+# Cards already in the deck library when searching it
+STORE_CARDS = 20000
+# Timings shorter than this are too noisy to flag as regressions
+MIN_COMPARABLE_SECONDS = 0.005
+
+_TERMS = ("cell membrane mitochondria ribosome enzyme protein nucleus chloroplast photosynthesis "
+          "respiration glucose energy molecule organism tissue gene chromosome mutation evolution "
+          "population ecosystem energy transport diffusion osmosis structure function").split()
+_FILLER = ("the a of in to and is are which that with by for from as this these its their "
+           "often usually mainly typically also").split()
+
+
+def make_corpus(size: int, seed: int = 0) -> str:
+    """Deterministic study-notes text of roughly size characters"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    section = 0
+    while length < size:
+        section += 1
+        lines = [f"Section {section}: {rng.choice(_TERMS).title()} {rng.choice(_TERMS).title()}", ""]
+        for _ in range(rng.randint(2, 5)):
+            sentences = []
+            for _ in range(rng.randint(3, 7)):
+                words = [rng.choice(_TERMS if rng.random() < 0.4 else _FILLER) for _ in range(rng.randint(8, 24))]
+                if rng.random() < 0.2:
+                    words[1:1] = ["is", "defined", "as"]
+                sentences.append(" ".join(words).capitalize() + ".")
+            lines.extend([" ".join(sentences), ""])
+        if rng.random() < 0.3:
+            lines.extend(f"- {rng.choice(_TERMS)} {rng.choice(_FILLER)} {rng.choice(_TERMS)}" for _ in range(4))
+            lines.append("")
+        block = "\n".join(lines) + "\n"
+        parts.append(block)
+        length += len(block)
+    return "".join(parts)[:size]
+
+
+def make_pdf(num_pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """Minimal valid PDF with num_pages pages of Helvetica text"""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(num_pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode())
+    font_id = 3 + 2 * num_pages
+    for i in range(num_pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        text_lines = " T* ".join(
+            "(" + " ".join(rng.choice(_TERMS + _FILLER) for _ in range(12)).capitalize() + ".) Tj"
+            for _ in range(lines_per_page)
+        )
+        stream = f"BT /F1 10 Tf 14 TL 50 760 Td {text_lines} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects):
+        offsets.append(out.tell())
+        out.write(f"{i + 1} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    out.write(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_cards(count: int, seed: int = 0) -> List[Dict]:
+    """Deck of count offline-style cards"""
+    rng = random.Random(seed)
+    return [{"question": f"What is {rng.choice(_TERMS)} {i}?",
+             "answer": " ".join(rng.choice(_TERMS + _FILLER) for _ in range(20)) + "; see notes.",
+             "difficulty": rng.choice(["Easy", "Medium", "Hard"])}
+            for i in range(count)]
+
+
+def build_deck(rows: List[Tuple[str, str, str]]) -> Deck:
+    deck = Deck()
+    for question, answer, difficulty in rows:
+        deck.add(question, answer, difficulty, "Biology")
+    return deck
+
+
+def write_to_tempfile(write: Callable[[io.IOBase], object]):
+    """Run an exporter against a real file, as the download path does"""
+    with tempfile.TemporaryFile() as out:
+        write(out)
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """Return (best wall time in seconds, peak traced bytes) for fn
+
+    fn runs once untimed first, so one-off costs such as loading the
+    tokenizer don't land in the samples compared with the baseline.
+    """
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def build_cases(quick: bool) -> List[Tuple[str, Callable[[], object], float, str]]:
+    """Return (name, fn, work units, unit) for every benchmark"""
+    generator = FlashcardGenerator(model_type="offline")
+    cases = []
+
+    for label, size in TEXT_SIZES:
+        if quick and size > (1 << 20):
+            continue
+        corpus = make_corpus(size)
+        cases.append((f"split_content[{label}]",
+                      lambda corpus=corpus: sum(1 for _ in generator._split_content(corpus)),
+                      len(corpus) / 1e6, "MB"))
+        cases.append((f"offline_flashcards[{label}]",
+                      lambda corpus=corpus: generator._generate_offline_flashcards(corpus, "Biology", 20),
+                      len(corpus) / 1e6, "MB"))
+
+    for pages in PDF_PAGES:
+        pdf = make_pdf(pages)
+        cases.append((f"extract_text_from_pdf[{pages}p]",
+                      lambda pdf=pdf: generator.extract_text_from_pdf(io.BytesIO(pdf)),
+                      pages, "pages"))
+
+    for count in EXPORT_CARDS:
+        cards = make_cards(count)
+        for name, iterator in (("csv", iter_csv), ("json", iter_json), ("anki", iter_anki_text)):
+            cases.append((f"export_{name}[{count}]",
+                          lambda cards=cards, iterator=iterator: write_to_tempfile(
+                              lambda out: write_text(iterator(cards), out)),
+                          count, "cards"))
+        cases.append((f"export_apkg[{count}]",
+                      lambda cards=cards: write_to_tempfile(lambda out: write_apkg(cards, out)),
+                      count, "cards"))
+        deck = Deck(cards, "Biology")
+        cases.append((f"export_csv_deck[{count}]",
+                      lambda deck=deck: write_to_tempfile(lambda out: write_text(iter_csv(deck), out)),
+                      count, "cards"))
+
+    # The card text already exists, so peak memory here is the per-card overhead of each representation
+    for count in DECK_CARDS:
+        rows = [(card["question"], card["answer"], card["difficulty"]) for card in make_cards(count)]
+        cases.append((f"deck_dicts[{count}]",
+                      lambda rows=rows: [{"question": q, "answer": a, "difficulty": d} for q, a, d in rows],
+                      count, "cards"))
+        cases.append((f"deck_cards[{count}]",
+                      lambda rows=rows: [Card(q, a, d, "Biology") for q, a, d in rows],
+                      count, "cards"))
+        cases.append((f"deck_columnar[{count}]", lambda rows=rows: build_deck(rows), count, "cards"))
+
+    # Every save replaces the previous deck with the same key, so repeats don't grow the store
+    store = DeckStore(os.path.join(tempfile.mkdtemp(prefix="flashcard-bench-"), "decks.sqlite3"))
+    cards = make_cards(STORE_CARDS)
+    cases.append((f"store_save[{STORE_CARDS}]",
+                  lambda: store.save_deck(cards, "bench", "Biology", "offline"),
+                  STORE_CARDS, "cards"))
+    store.save_deck(cards, "bench", "Biology", "offline")
+    cases.append((f"store_search[{STORE_CARDS}]",
+                  lambda: [store.search(term, subject="Biology") for term in _TERMS],
+                  len(_TERMS), "queries"))
+    return cases
+
+
+def load_baseline() -> Dict:
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--quick", action="store_true", help="skip corpora larger than 1 MB")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown or memory growth over the baseline (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline()
+    results = {}
+    regressions = []
+
+    print(f"{'benchmark':34} {'best':>9} {'throughput':>18} {'peak mem':>10}  vs baseline")
+    for name, fn, units, unit in build_cases(args.quick):
+        if args.filter not in name:
+            continue
+        seconds, peak = measure(fn, args.repeat)
+        results[name] = {"seconds": round(seconds, 6), "throughput": round(units / seconds, 3),
+                         "unit": f"{unit}/s", "peak_bytes": peak}
+
+        comparison = "new"
+        previous = baseline.get(name)
+        if previous:
+            slowdown = seconds / previous["seconds"] - 1
+            growth = peak / max(previous["peak_bytes"], 1) - 1
+            comparison = f"time {slowdown:+.0%}, mem {growth:+.0%}"
+            timed = previous["seconds"] >= MIN_COMPARABLE_SECONDS
+            if (timed and slowdown > args.tolerance) or growth > args.tolerance:
+                regressions.append(name)
+                comparison += "  REGRESSION"
+        print(f"{name:34} {seconds * 1000:7.1f}ms {units / seconds:12.1f} {unit + '/s':>5} "
+              f"{peak / 1e6:8.1f}MB  {comparison}", flush=True)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline updated: {BASELINE_PATH}")
+    elif regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
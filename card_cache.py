@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# Cache hits whose access times are buffered before they are written in one transaction
+ACCESS_FLUSH_EVERY = 256
+
+
+def make_cache_key(model_url: str, prompt_template: str, chunk: str, parameters: Dict) -> str:
+    """Content-address one generation by everything that influences its output"""
+    material = json.dumps(
+        [model_url, prompt_template, chunk, parameters],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Persistent SQLite cache of generated text keyed by make_cache_key
+
+    Entries expire after ttl_seconds and the least recently used entries are
+    evicted once the store grows past max_entries or max_bytes. One cache
+    instance can be shared by every generator and worker thread in a process.
+
+    A hit only notes its access time in memory; the times are written in one
+    transaction with the next put, or after ACCESS_FLUSH_EVERY hits, so a
+    fully cached deck doesn't cost a commit per card. Times not yet written
+    when the process exits are lost, which only blurs the LRU order.
+    """
+
+    def __init__(self, path: str = ".flashcard_cache/generations.sqlite3",
+                 max_entries: int = 50000, max_bytes: int = 100 * 1024 * 1024,
+                 ttl_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_access ON generations(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_EVERY:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+            return value
+
+    def contains(self, key: str) -> bool:
+        """True if key has a live entry; unlike get, not counted as a hit and not marked as used"""
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM generations WHERE key = ?", (key,)).fetchone()
+        return row is not None and not (self.ttl_seconds and time.time() - row[0] > self.ttl_seconds)
+
+    def put(self, key: str, value: str):
+        """Store value under key and evict old entries if the store is over budget"""
+        now = time.time()
+        with self._lock:
+            # Eviction needs the recent hits' access times
+            self._flush_access()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _flush_access(self):
+        """Write the buffered access times; the caller commits"""
+        if self._accessed:
+            self._conn.executemany("UPDATE generations SET last_access = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones until within budget"""
+        if self.ttl_seconds:
+            cursor = self._conn.execute(
+                "DELETE FROM generations WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations"
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        # Trim to 90% of the budget so a full store doesn't evict on every put
+        entry_target = int(self.max_entries * 0.9)
+        byte_target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM generations ORDER BY last_access ASC"
+        )
+        stale_keys = []
+        for key, size in rows:
+            if count <= entry_target and total_bytes <= byte_target:
+                break
+            stale_keys.append((key,))
+            count -= 1
+            total_bytes -= size
+        self._conn.executemany("DELETE FROM generations WHERE key = ?", stale_keys)
+        self.evictions += len(stale_keys)
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM generations")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the current size of the store"""
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total_bytes
+        }
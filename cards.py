@@ -0,0 +1,182 @@
+import sys
+from array import array
+from collections.abc import Mapping
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+class Difficulty(str, Enum):
+    """Card difficulty; members are shared, so a card only holds a reference"""
+
+    EASY = "Easy"
+    MEDIUM = "Medium"
+    HARD = "Hard"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def parse(cls, value: Union[str, "Difficulty", None]) -> "Difficulty":
+        """Map "Easy"/"medium"/... to a member; anything unknown counts as Medium"""
+        member = _DIFFICULTY_VALUES.get(value)
+        if member is not None:
+            return member
+        return _DIFFICULTY_NAMES.get(str(value or "").strip().lower(), cls.MEDIUM)
+
+
+# Members hash like their values, so these also match "Easy" and friends directly
+_DIFFICULTY_VALUES = {member: member for member in Difficulty}
+_DIFFICULTY_NAMES = {member.value.lower(): member for member in Difficulty}
+_DIFFICULTIES = list(Difficulty)
+_DIFFICULTY_CODES = {member: code for code, member in enumerate(_DIFFICULTIES)}
+
+
+class Card(Mapping):
+    """One flashcard in four slots instead of a dict
+
+    Reads like the dicts cards used to be: card["question"], card.get(
+    "difficulty") and dict(card) all work, and a Card equals the dict
+    with the same question, answer and difficulty. subject is an interned
+    string kept alongside, not one of the mapping's keys.
+    """
+
+    __slots__ = ("question", "answer", "difficulty", "subject")
+
+    _KEYS = ("question", "answer", "difficulty")
+
+    def __init__(self, question: str, answer: str, difficulty: Union[str, Difficulty] = Difficulty.MEDIUM,
+                 subject: Optional[str] = None):
+        self.question = question
+        self.answer = answer
+        self.difficulty = Difficulty.parse(difficulty)
+        self.subject = sys.intern(subject) if subject else None
+
+    @classmethod
+    def from_mapping(cls, card: Mapping, subject: Optional[str] = None) -> "Card":
+        if isinstance(card, Card) and (subject is None or card.subject == subject):
+            return card
+        return cls(card["question"], card["answer"], card.get("difficulty", Difficulty.MEDIUM),
+                   subject or getattr(card, "subject", None))
+
+    def __getitem__(self, key: str):
+        if key == "difficulty":
+            return self.difficulty.value
+        if key in ("question", "answer"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"question": self.question, "answer": self.answer, "difficulty": self.difficulty.value}
+
+    def __repr__(self) -> str:
+        return f"Card({self.question!r}, {self.answer!r}, {self.difficulty.value!r}, subject={self.subject!r})"
+
+
+class Deck:
+    """Columnar flashcard storage for large decks
+
+    Questions and answers live in two lists, difficulty in a byte array
+    and subject in an array of codes into the deck's own subject table, so
+    a card costs two list slots and three bytes on top of its text.
+    Iterating or indexing yields Card views; rows() gives exporters plain
+    (question, answer, difficulty) tuples without building any objects.
+    Decks pickle compactly, which keeps batch workers' results small.
+    """
+
+    __slots__ = ("questions", "answers", "_difficulties", "_subject_codes", "_subjects", "_subject_index")
+
+    def __init__(self, cards: Iterable[Mapping] = (), subject: Optional[str] = None):
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self._difficulties = array("B")
+        self._subject_codes = array("H")
+        # Code 0 is "no subject"
+        self._subjects: List[Optional[str]] = [None]
+        self._subject_index: Dict[Optional[str], int] = {None: 0}
+        self.extend(cards, subject)
+
+    def _subject_code(self, subject: Optional[str]) -> int:
+        code = self._subject_index.get(subject)
+        if code is None:
+            code = len(self._subjects)
+            self._subjects.append(sys.intern(subject))
+            self._subject_index[subject] = code
+        return code
+
+    def add(self, question: str, answer: str, difficulty: Union[str, Difficulty] = Difficulty.MEDIUM,
+            subject: Optional[str] = None):
+        """Append one card from its fields"""
+        self.questions.append(question)
+        self.answers.append(answer)
+        code = _DIFFICULTY_CODES.get(difficulty)
+        self._difficulties.append(code if code is not None else _DIFFICULTY_CODES[Difficulty.parse(difficulty)])
+        code = self._subject_index.get(subject)
+        self._subject_codes.append(code if code is not None else self._subject_code(subject))
+
+    def append(self, card: Mapping, subject: Optional[str] = None):
+        """Append a card dict or Card; subject defaults to the card's own"""
+        self.add(card["question"], card["answer"], card.get("difficulty", Difficulty.MEDIUM),
+                 subject or getattr(card, "subject", None))
+
+    def extend(self, cards: Iterable[Mapping], subject: Optional[str] = None):
+        if isinstance(cards, Deck) and subject is None:
+            self.questions.extend(cards.questions)
+            self.answers.extend(cards.answers)
+            self._difficulties.extend(cards._difficulties)
+            self._subject_codes.extend(self._subject_code(cards._subjects[code]) for code in cards._subject_codes)
+            return
+        for card in cards:
+            self.append(card, subject)
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def _card(self, i: int) -> Card:
+        card = Card.__new__(Card)
+        card.question = self.questions[i]
+        card.answer = self.answers[i]
+        card.difficulty = _DIFFICULTIES[self._difficulties[i]]
+        card.subject = self._subjects[self._subject_codes[i]]
+        return card
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Card, "Deck"]:
+        if isinstance(index, slice):
+            deck = Deck()
+            deck.questions = self.questions[index]
+            deck.answers = self.answers[index]
+            deck._difficulties = self._difficulties[index]
+            deck._subject_codes = self._subject_codes[index]
+            deck._subjects = list(self._subjects)
+            deck._subject_index = dict(self._subject_index)
+            return deck
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("deck index out of range")
+        return self._card(index)
+
+    def __iter__(self) -> Iterator[Card]:
+        return (self._card(i) for i in range(len(self)))
+
+    def rows(self) -> Iterator[Tuple[str, str, str]]:
+        """(question, answer, difficulty) for every card, in order"""
+        names = [member.value for member in _DIFFICULTIES]
+        return zip(self.questions, self.answers, (names[code] for code in self._difficulties))
+
+    def subjects(self) -> List[str]:
+        """Subjects used in this deck"""
+        return [subject for subject in self._subjects if subject is not None]
+
+    def to_dicts(self) -> List[Dict[str, str]]:
+        """The plain card dicts older callers expect"""
+        return [{"question": question, "answer": answer, "difficulty": difficulty}
+                for question, answer, difficulty in self.rows()]
+
+    def __repr__(self) -> str:
+        return f"Deck({len(self)} cards)"
@@ -0,0 +1,233 @@
+import re
+import threading
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Words whose trailing period never ends a sentence
+ABBREVIATIONS = {
+    "e.g", "i.e", "etc", "vs", "cf", "al", "approx", "fig", "figs", "eq", "eqs",
+    "no", "vol", "ch", "sec", "pp", "dr", "mr", "mrs", "ms", "prof", "st", "jr",
+    "sr", "inc", "ltd", "co", "jan", "feb", "mar", "apr", "jun", "jul", "aug",
+    "sep", "sept", "oct", "nov", "dec", "u.s", "u.k", "ca", "resp", "min", "max"
+}
+
+# Candidate sentence ends: terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace and something that can start a sentence. Decimals
+# such as 6.02 and formulas such as C6H12O6 never match because no whitespace
+# follows the period.
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s+[\"'(\[]?[A-Z0-9])")
+_HEADING = re.compile(r"^\s*(#{1,6}\s+\S|[A-Z][A-Z0-9 ,:&'-]{2,80}$)")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_FALLBACK_TOKEN = re.compile(r"\w{1,6}|[^\w\s]")
+
+_tokenizers: Dict[str, Optional[object]] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _load_tokenizer(model_name: str):
+    """Load a tokenizer, preferring files already in the local HF cache"""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        return None
+    for local_files_only in (True, False):
+        try:
+            return AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+        except Exception:
+            continue
+    return None
+
+
+def get_token_counter(model_name: Optional[str]) -> Callable[[List[str]], List[int]]:
+    """Return a function counting tokens for a batch of strings
+
+    Uses the transformers tokenizer for model_name, loaded once per process.
+    When it can't be loaded (no network, no cached files) the counter falls
+    back to a sub-word estimate that splits long words into 6-character pieces.
+    """
+    tokenizer = None
+    if model_name:
+        with _tokenizers_lock:
+            if model_name not in _tokenizers:
+                _tokenizers[model_name] = _load_tokenizer(model_name)
+            tokenizer = _tokenizers[model_name]
+
+    if tokenizer is None:
+        return lambda texts: [len(_FALLBACK_TOKEN.findall(text)) for text in texts]
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """Split one paragraph into sentences without breaking abbreviations or decimals"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(paragraph):
+        if match.group().startswith("."):
+            word_start = max(paragraph.rfind(" ", start, match.start()) + 1, start)
+            word = paragraph[word_start:match.start()].lstrip("(\"'[").lower()
+            # Abbreviations and single-letter initials ("J. Watson") don't end sentences
+            if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                continue
+        sentence = paragraph[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    tail = paragraph[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def iter_blocks(text: Union[str, Iterable[str]]) -> Iterator[Tuple[str, bool]]:
+    """Yield (paragraph, is_heading) blocks from a string or a stream of pieces
+
+    Blank lines end paragraphs, and headings and list items form blocks of
+    their own. Wrapped lines inside a paragraph (typical of PDF text) are
+    joined with a space. Pieces such as PDF pages are consumed lazily, so
+    blocks are produced before the rest of the document has arrived.
+    """
+    pieces = [text] if isinstance(text, str) else text
+    lines: List[str] = []
+    pending = ""
+
+    def flush():
+        if lines:
+            paragraph = " ".join(lines)
+            lines.clear()
+            return paragraph
+        return None
+
+    # A short title-like line is only known to be a heading once the next line is seen
+    title: List[str] = []
+
+    def is_heading(stripped: str) -> bool:
+        if _HEADING.match(stripped):
+            return True
+        # Short lines opening a paragraph and ending in a colon, e.g. "Cell Membrane:"
+        return not lines and stripped[0].isupper() and len(stripped.split()) <= 8 and stripped.endswith(":")
+
+    def is_title(stripped: str) -> bool:
+        # e.g. "Cell Membrane", but also the first line of a wrapped paragraph
+        return not lines and stripped[0].isupper() and len(stripped.split()) <= 8 and stripped[-1].isalnum()
+
+    def feed(line: str):
+        stripped = line.strip()
+        if title:
+            # Standing alone or followed by a new block it is a heading; otherwise its text goes on
+            candidate = title.pop()
+            if not stripped or _LIST_ITEM.match(stripped) or is_heading(stripped):
+                yield candidate, True
+            else:
+                lines.append(candidate)
+                lines.append(stripped)
+                return
+        if not stripped:
+            paragraph = flush()
+            if paragraph:
+                yield paragraph, False
+        elif _LIST_ITEM.match(stripped) or is_heading(stripped):
+            paragraph = flush()
+            if paragraph:
+                yield paragraph, False
+            if _LIST_ITEM.match(stripped):
+                lines.append(stripped)
+            else:
+                yield stripped.lstrip("#").strip(), True
+        elif is_title(stripped):
+            title.append(stripped)
+        else:
+            lines.append(stripped)
+
+    for piece in pieces:
+        buffer = pending + piece
+        parts = buffer.split("\n")
+        pending = parts.pop()
+        for line in parts:
+            yield from feed(line)
+    yield from feed(pending)
+    if title:
+        yield title.pop(), True
+    paragraph = flush()
+    if paragraph:
+        yield paragraph, False
+
+
+class TextChunker:
+    """Single-pass, token-aware chunker
+
+    Chunks are at most max_tokens tokenizer tokens, break on sentence
+    boundaries, start a fresh chunk at headings once the current one is at
+    least half full, and repeat up to overlap_tokens of trailing sentences
+    from the previous chunk for context.
+
+    With anchor_every > 0, a chunk that is at least half full also ends
+    after any "anchor" sentence, roughly one in anchor_every sentences
+    chosen by a hash of the sentence text. Boundaries then depend on the
+    local text rather than on everything before it, so an edit only changes
+    the chunks around it and chunking falls back into step right after.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, max_tokens: int = 256, overlap_tokens: int = 32,
+                 anchor_every: int = 0):
+        self.max_tokens = max(16, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.anchor_every = anchor_every
+        self.count_tokens = get_token_counter(model_name)
+
+    def _split_long_sentence(self, sentence: str, tokens: int) -> List[Tuple[str, int]]:
+        """Break a sentence longer than max_tokens into word windows"""
+        words = sentence.split()
+        words_per_piece = max(1, len(words) * self.max_tokens // max(tokens, 1))
+        pieces = [" ".join(words[i:i + words_per_piece]) for i in range(0, len(words), words_per_piece)]
+        return list(zip(pieces, self.count_tokens(pieces)))
+
+    def iter_chunks(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Yield chunks of text lazily from a string or a stream of pieces"""
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        fresh_tokens = 0  # tokens in the current chunk that aren't overlap
+
+        def emit(keep_overlap: bool):
+            nonlocal current, current_tokens, fresh_tokens
+            chunk = " ".join(sentence for sentence, _ in current)
+            carried = []
+            if keep_overlap and self.overlap_tokens:
+                carried_tokens = 0
+                for sentence, tokens in reversed(current):
+                    if carried_tokens + tokens > self.overlap_tokens:
+                        break
+                    carried.append((sentence, tokens))
+                    carried_tokens += tokens
+                carried.reverse()
+            current = carried
+            current_tokens = sum(tokens for _, tokens in carried)
+            fresh_tokens = 0
+            return chunk
+
+        for paragraph, is_heading in iter_blocks(text):
+            if is_heading and fresh_tokens >= self.max_tokens // 2:
+                yield emit(keep_overlap=False)
+
+            sentences = [paragraph] if is_heading else split_sentences(paragraph)
+            for sentence, tokens in zip(sentences, self.count_tokens(sentences)):
+                units = [(sentence, tokens)] if tokens <= self.max_tokens else self._split_long_sentence(sentence, tokens)
+                for unit, unit_tokens in units:
+                    if current_tokens + unit_tokens > self.max_tokens and fresh_tokens:
+                        yield emit(keep_overlap=True)
+                        # Drop overlap that would leave no room for the new sentence
+                        while current and current_tokens + unit_tokens > self.max_tokens:
+                            current_tokens -= current.pop(0)[1]
+                    current.append((unit, unit_tokens))
+                    current_tokens += unit_tokens
+                    fresh_tokens += unit_tokens
+                    if (self.anchor_every and fresh_tokens >= self.max_tokens // 2
+                            and zlib.crc32(unit.encode("utf-8")) % self.anchor_every == 0):
+                        yield emit(keep_overlap=True)
+
+        if fresh_tokens:
+            yield emit(keep_overlap=False)
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from cards import Deck, Difficulty
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS decks (
+        id INTEGER PRIMARY KEY,
+        source_hash TEXT NOT NULL,
+        subject TEXT NOT NULL COLLATE NOCASE,
+        backend TEXT NOT NULL,
+        num_cards INTEGER NOT NULL,
+        card_count INTEGER NOT NULL,
+        name TEXT,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_decks_source ON decks(source_hash, subject, backend, num_cards)",
+    "CREATE INDEX IF NOT EXISTS idx_decks_subject ON decks(subject, created_at)",
+    """CREATE TABLE IF NOT EXISTS cards (
+        id INTEGER PRIMARY KEY,
+        deck_id INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        difficulty TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_cards_deck ON cards(deck_id, position)",
+    "CREATE INDEX IF NOT EXISTS idx_cards_difficulty ON cards(difficulty)",
+    # External-content index: the text lives once, in cards; the triggers keep the index in step
+    """CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+        question, answer, content='cards', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+        INSERT INTO cards_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+        INSERT INTO cards_fts(cards_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END""",
+)
+
+
+def content_hash(content: str) -> str:
+    """Identify a source document by its extracted text"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def match_query(text: str) -> str:
+    """Turn free text into an FTS5 query that matches cards containing every word
+
+    Words are quoted so punctuation and FTS operators in the input can't
+    break the query; the last word also matches as a prefix, for typing.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+class DeckStore:
+    """Persistent SQLite store of generated decks with a full-text index over their cards
+
+    Each deck records the hash of its source text, its subject and the
+    backend that generated it, so the same request can be answered later
+    without generating again. A deck is written in one transaction and
+    replaces an earlier deck for the same source, subject, backend and card
+    count. One store instance can be shared by every session and worker
+    thread in a process.
+    """
+
+    def __init__(self, path: str = ".flashcard_cache/decks.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def save_deck(self, cards: Iterable[Mapping], source_hash: str, subject: str, backend: str,
+                  num_cards: Optional[int] = None, name: Optional[str] = None) -> int:
+        """Store a deck and its cards in a single transaction and return the deck's id
+
+        num_cards is the number of cards that was asked for (defaults to
+        the number stored); it is part of what find_deck matches on.
+        """
+        if isinstance(cards, Deck):
+            rows = list(cards.rows())
+        else:
+            rows = [(card["question"], card["answer"], str(Difficulty.parse(card.get("difficulty"))))
+                    for card in cards]
+        if num_cards is None:
+            num_cards = len(rows)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM decks WHERE source_hash = ? AND subject = ? AND backend = ? AND num_cards = ?",
+                (source_hash, subject, backend, num_cards)
+            )
+            deck_id = self._conn.execute(
+                "INSERT INTO decks (source_hash, subject, backend, num_cards, card_count, name, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source_hash, subject, backend, num_cards, len(rows), name, time.time())
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO cards (deck_id, position, question, answer, difficulty) VALUES (?, ?, ?, ?, ?)",
+                ((deck_id, position, question, answer, difficulty)
+                 for position, (question, answer, difficulty) in enumerate(rows))
+            )
+        return deck_id
+
+    def find_deck(self, source_hash: str, subject: str, backend: str,
+                  num_cards: Optional[int] = None) -> Optional[Dict]:
+        """Return the newest stored deck for this source and settings, or None"""
+        query = "SELECT * FROM decks WHERE source_hash = ? AND subject = ? AND backend = ?"
+        parameters: list = [source_hash, subject, backend]
+        if num_cards is not None:
+            query += " AND num_cards = ?"
+            parameters.append(num_cards)
+        with self._lock:
+            cursor = self._conn.execute(query + " ORDER BY created_at DESC LIMIT 1", parameters)
+            row = cursor.fetchone()
+            return self._deck_info(cursor, row) if row else None
+
+    def load_deck(self, deck_id: int) -> Optional[Deck]:
+        """Read a stored deck back in card order, or None if it doesn't exist"""
+        with self._lock:
+            info = self._conn.execute("SELECT subject FROM decks WHERE id = ?", (deck_id,)).fetchone()
+            if info is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT question, answer, difficulty FROM cards WHERE deck_id = ? ORDER BY position", (deck_id,)
+            ).fetchall()
+        deck = Deck()
+        for question, answer, difficulty in rows:
+            deck.add(question, answer, difficulty, info[0])
+        return deck
+
+    def list_decks(self, subject: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Stored decks, newest first, optionally only one subject's"""
+        query = "SELECT * FROM decks"
+        parameters: list = []
+        if subject:
+            query += " WHERE subject = ?"
+            parameters.append(subject)
+        with self._lock:
+            cursor = self._conn.execute(query + " ORDER BY created_at DESC LIMIT ?", parameters + [limit])
+            return [self._deck_info(cursor, row) for row in cursor.fetchall()]
+
+    def search(self, text: str = "", subject: Optional[str] = None, difficulty: Optional[str] = None,
+               backend: Optional[str] = None, deck_id: Optional[int] = None,
+               limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Cards matching every word of text and the given filters, best matches first
+
+        search("chloroplast", subject="Biology") finds the Biology cards
+        mentioning chloroplasts (or chloroplast, thanks to stemming). With
+        no text the filters alone pick the cards, in deck order.
+        """
+        conditions = []
+        parameters: list = []
+        fts_query = match_query(text)
+        if fts_query:
+            source = "cards_fts JOIN cards ON cards.id = cards_fts.rowid"
+            conditions.append("cards_fts MATCH ?")
+            parameters.append(fts_query)
+            order = "bm25(cards_fts)"
+        else:
+            source = "cards"
+            order = "decks.created_at DESC, cards.position"
+        for column, value in (("decks.subject", subject), ("cards.difficulty", difficulty),
+                              ("decks.backend", backend), ("decks.id", deck_id)):
+            if value:
+                conditions.append(f"{column} = ?")
+                parameters.append(str(Difficulty.parse(value)) if column == "cards.difficulty" else value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT cards.question, cards.answer, cards.difficulty, decks.subject, decks.id, decks.name "
+                f"FROM {source} JOIN decks ON decks.id = cards.deck_id{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                parameters + [limit, offset]
+            ).fetchall()
+        keys = ("question", "answer", "difficulty", "subject", "deck_id", "deck_name")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def delete_deck(self, deck_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+
+    def stats(self) -> Dict:
+        """Return how many decks and cards are stored"""
+        with self._lock:
+            decks = self._conn.execute("SELECT COUNT(*) FROM decks").fetchone()[0]
+            cards = self._conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+        return {"decks": decks, "cards": cards}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _deck_info(cursor: sqlite3.Cursor, row: tuple) -> Dict:
+        return dict(zip((column[0] for column in cursor.description), row))
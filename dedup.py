@@ -0,0 +1,80 @@
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve crosses 0.5 closest to threshold"""
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index that flags texts nearly identical to ones already seen
+
+    Texts are normalized and cut into character shingles. Each text gets a
+    MinHash signature, and the signature's bands are hashed into LSH
+    buckets. A new text is only compared with texts sharing a bucket, so an
+    insertion costs about the same whether the index holds ten texts or ten
+    thousand.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 4, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def _shingles(self, text: str) -> np.ndarray:
+        normalized = _NON_WORD.sub(" ", text.lower()).strip()
+        if len(normalized) <= self.shingle_size:
+            grams = {normalized}
+        else:
+            grams = {normalized[i:i + self.shingle_size] for i in range(len(normalized) - self.shingle_size + 1)}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of text"""
+        hashes = self._shingles(text)
+        # (a*h + b) mod p for every permutation and shingle; uint64 wraps, which is fine for hashing
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def add(self, text: str) -> bool:
+        """Insert text unless it is a near-duplicate; returns True if it was inserted"""
+        signature = self.signature(text)
+        band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(self._buckets[band].get(key, ()))
+        for candidate in candidates:
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return False
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(index)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._signatures)
@@ -0,0 +1,175 @@
+import json
+import math
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+# Starting guesses (seconds) used until a key has real measurements
+PRIORS = {
+    "huggingface/request": 3.0,
+    "huggingface/cold_start": 20.0,
+    "local/request": 6.0,
+    "local/cold_start": 15.0,
+    "offline/generation_per_mb": 0.3,
+}
+
+# Measurements below this are a warm model, not a cold start
+COLD_START_THRESHOLD = 1.0
+
+
+class RollingStat:
+    """Exponentially weighted mean and variance that start out as a plain average"""
+
+    __slots__ = ("mean", "variance", "count")
+
+    def __init__(self, mean: float = 0.0, variance: float = 0.0, count: int = 0):
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+
+    def update(self, value: float, min_alpha: float):
+        self.count += 1
+        alpha = max(1.0 / self.count, min_alpha)
+        delta = value - self.mean
+        self.mean += alpha * delta
+        self.variance = (1 - alpha) * (self.variance + alpha * delta * delta)
+
+
+class LatencyEstimator:
+    """Rolling latency statistics per backend and prompt type, persisted as JSON
+
+    Keys look like "huggingface/request/packed" or "local/cold_start". Each
+    key keeps an exponentially weighted mean and variance, so the estimate
+    follows the endpoint as it speeds up or slows down. Statistics are
+    saved after every update and reloaded on start, so they survive restarts.
+    """
+
+    def __init__(self, path: Optional[str] = ".flashcard_cache/latency_stats.json", min_alpha: float = 0.1):
+        self.path = path
+        self.min_alpha = min_alpha
+        self._stats: Dict[str, RollingStat] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+            self._stats = {key: RollingStat(value["mean"], value["variance"], value["count"])
+                           for key, value in stored.items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            # A corrupt stats file only costs us the history
+            self._stats = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        snapshot = {key: {"mean": stat.mean, "variance": stat.variance, "count": stat.count}
+                    for key, stat in self._stats.items()}
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".latency-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError:
+            os.unlink(temp_path)
+
+    def observe(self, key: str, value: float, save: bool = True):
+        """Fold one measurement into key's statistics"""
+        with self._lock:
+            self._stats.setdefault(key, RollingStat()).update(value, self.min_alpha)
+            if save:
+                self._save()
+
+    def expected(self, key: str, fallback_key: Optional[str] = None) -> Tuple[float, float, int]:
+        """Return (mean, standard deviation, samples) for key
+
+        Falls back to fallback_key, then to the prior for either key.
+        """
+        with self._lock:
+            for candidate in (key, fallback_key):
+                stat = self._stats.get(candidate) if candidate else None
+                if stat and stat.count:
+                    return stat.mean, math.sqrt(stat.variance), stat.count
+        prior = PRIORS.get(key, PRIORS.get(fallback_key or "", 0.0))
+        # Without data, assume the spread is as large as the guess itself
+        return prior, prior, 0
+
+    def record_deck(self, backend: str, prompt_type: str, deck: Dict, content_chars: int):
+        """Learn from a finished deck's metrics summary (see metrics.DeckMetrics)"""
+        stages = deck.get("stages", {})
+        observations = []
+        request_stage = "local_inference" if backend == "local" else "hf_request"
+        if request_stage in stages and stages[request_stage]["runs"]:
+            timing = stages[request_stage]
+            observations.append((f"{backend}/request/{prompt_type}", timing["seconds"] / timing["runs"]))
+        wait = stages.get("readiness_wait", {}).get("seconds", 0.0)
+        if wait >= COLD_START_THRESHOLD:
+            observations.append((f"{backend}/cold_start", wait))
+        megabytes = content_chars / 1e6
+        if megabytes > 0:
+            for stage, key in (("offline_generation", "generation_per_mb"), ("offline_fallback", "fallback_per_mb")):
+                if stage in stages:
+                    observations.append((f"{backend}/{key}", stages[stage]["seconds"] / megabytes))
+
+        for i, (key, value) in enumerate(observations):
+            self.observe(key, value, save=i == len(observations) - 1)
+
+    def predict(self, backend: str, prompt_type: str, plan: Dict, warm: bool,
+                concurrency: float = 1.0, requests_per_second: Optional[float] = None) -> Dict:
+        """Predict wall time for a generation plan
+
+        plan holds the chunk plan from FlashcardGenerator.plan_generation:
+        requests, content_chars and the measured chunking_seconds. Requests
+        run in waves of concurrency (one at a time for the local model) and
+        can't go faster than requests_per_second. Returns the expected
+        seconds, a pessimistic high estimate and the breakdown behind them.
+        """
+        megabytes = plan.get("content_chars", 0) / 1e6
+        breakdown = {"chunking": plan.get("chunking_seconds", 0.0)}
+        spread = 0.0
+
+        if backend == "offline":
+            mean, std, _ = self.expected("offline/generation_per_mb")
+            breakdown["generation"] = mean * megabytes
+            spread = std * megabytes
+        else:
+            requests = plan.get("requests", 0)
+            mean, std, _ = self.expected(f"{backend}/request/{prompt_type}", f"{backend}/request")
+            waves = requests if backend == "local" else math.ceil(requests / max(1.0, concurrency))
+            api_seconds = waves * mean
+            if requests_per_second:
+                api_seconds = max(api_seconds, requests / requests_per_second)
+            breakdown["requests"] = api_seconds
+            # Waves run one after another, so their spreads add up in quadrature
+            spread = math.sqrt(waves) * std
+            if not warm:
+                cold_mean, cold_std, _ = self.expected(f"{backend}/cold_start")
+                breakdown["cold_start"] = cold_mean
+                spread = math.hypot(spread, cold_std)
+            fallback_mean, _, samples = self.expected(f"{backend}/fallback_per_mb")
+            if samples:
+                breakdown["fallback"] = fallback_mean * megabytes
+
+        seconds = sum(breakdown.values())
+        return {"seconds": seconds, "high_seconds": seconds + 1.28 * spread,
+                "breakdown": breakdown, "plan": plan}
+
+
+_estimators: Dict[str, LatencyEstimator] = {}
+_estimators_lock = threading.Lock()
+
+
+def get_latency_estimator(path: str = ".flashcard_cache/latency_stats.json") -> LatencyEstimator:
+    """Return the estimator shared by every generator using path"""
+    with _estimators_lock:
+        estimator = _estimators.get(path)
+        if estimator is None:
+            estimator = LatencyEstimator(path)
+            _estimators[path] = estimator
+        return estimator
@@ -0,0 +1,196 @@
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple
+
+from cards import Deck
+
+# Pieces are gathered into writes of roughly this many characters
+_WRITE_SIZE = 64 * 1024
+
+_ANKI_SCHEMA = """
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null, usn integer not null,
+    ls integer not null, conf text not null, models text not null, decks text not null,
+    dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null, flds text not null,
+    sfld integer not null, csum integer not null, flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null, type integer not null,
+    queue integer not null, due integer not null, ivl integer not null, factor integer not null,
+    reps integer not null, lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null, factor integer not null,
+    time integer not null, type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+_ANKI_DECK_CONFIG = {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True,
+    "timer": 0, "replayq": True, "dyn": False,
+    "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 7],
+            "order": 1, "perDay": 20, "separate": True},
+    "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0},
+    "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500,
+            "minSpace": 1, "perDay": 100},
+}
+
+
+def _rows(flashcards: Iterable[Dict]) -> Iterator[Tuple[str, str, str]]:
+    """(question, answer, difficulty) per card; a Deck hands over its columns directly"""
+    if isinstance(flashcards, Deck):
+        return flashcards.rows()
+    return ((card['question'], card['answer'], card.get('difficulty', 'Medium')) for card in flashcards)
+
+
+def iter_csv(flashcards: Iterable[Dict]) -> Iterator[str]:
+    """Yield a CSV export of flashcards one row at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Question', 'Answer', 'Difficulty'])
+    for question, answer, difficulty in _rows(flashcards):
+        writer.writerow([question, answer, difficulty])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_json(flashcards: Iterable[Dict]) -> Iterator[str]:
+    """Yield the same text as json.dumps(flashcards, indent=2), one card at a time"""
+    encoder = json.JSONEncoder(indent=2)
+    separator = "[\n  "
+    if isinstance(flashcards, Deck):
+        flashcards = ({"question": question, "answer": answer, "difficulty": difficulty}
+                      for question, answer, difficulty in flashcards.rows())
+    for card in flashcards:
+        # Card views and other mappings encode like the dicts they stand in for
+        yield separator + encoder.encode(card if isinstance(card, dict) else dict(card)).replace("\n", "\n  ")
+        separator = ",\n  "
+    yield "[]" if separator == "[\n  " else "\n]"
+
+
+def iter_anki_text(flashcards: Iterable[Dict]) -> Iterator[str]:
+    """Yield an Anki text import file (Front;Back;Tags)
+
+    Fields are quoted whenever they contain the separator, quotes or line
+    breaks, and the header lines tell Anki how to read the file.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    buffer.write("#separator:Semicolon\n#html:false\n#columns:Front;Back;Tags\n#tags column:3\n")
+    for question, answer, difficulty in _rows(flashcards):
+        writer.writerow([question, answer, difficulty.replace(' ', '_')])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_text(pieces: Iterable[str], out: BinaryIO):
+    """Encode text pieces as UTF-8 into a binary file, a block at a time"""
+    block = []
+    size = 0
+    for piece in pieces:
+        block.append(piece)
+        size += len(piece)
+        if size >= _WRITE_SIZE:
+            out.write("".join(block).encode("utf-8"))
+            block = []
+            size = 0
+    if block:
+        out.write("".join(block).encode("utf-8"))
+
+
+def _stable_id(name: str) -> int:
+    """Millisecond-style id derived from name, so re-exports map to the same deck and model"""
+    return (1 << 40) + int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:9], 16)
+
+
+def _anki_collection(deck_name: str, deck_id: int, model_id: int, now: int) -> tuple:
+    """Return the single row of the col table for a collection with one deck and one model"""
+    model = {
+        "id": model_id, "name": "Flashcard Generator Basic", "type": 0, "mod": now, "usn": -1,
+        "sortf": 0, "did": deck_id, "tags": [], "vers": [], "req": [[0, "any", [0]]],
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n"
+                    "\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "css": ".card { font-family: arial; font-size: 20px; text-align: center; }",
+        "flds": [{"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial",
+                  "size": 20, "media": []} for i, name in enumerate(("Front", "Back"))],
+        "tmpls": [{"name": "Card 1", "ord": 0, "qfmt": "{{Front}}",
+                   "afmt": "{{FrontSide}}<hr id=answer>{{Back}}", "did": None,
+                   "bqfmt": "", "bafmt": ""}],
+    }
+
+    def deck(did, name):
+        return {"id": did, "name": name, "desc": "", "mod": now, "usn": -1, "collapsed": False,
+                "browserCollapsed": False, "dyn": 0, "conf": 1, "extendNew": 0, "extendRev": 0,
+                "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0]}
+
+    conf = {"activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200,
+            "timeLim": 0, "estTimes": True, "dueCounts": True, "curModel": None,
+            "nextPos": 1, "sortType": "noteFld", "sortBackwards": False, "addToCur": True}
+    decks = {"1": deck(1, "Default"), str(deck_id): deck(deck_id, deck_name)}
+    return (1, now, now * 1000, now * 1000, 11, 0, 0, 0, json.dumps(conf),
+            json.dumps({str(model_id): model}), json.dumps(decks),
+            json.dumps({"1": _ANKI_DECK_CONFIG}), "{}")
+
+
+def write_apkg(flashcards: Iterable[Dict], out: BinaryIO, deck_name: str = "Flashcards"):
+    """Write flashcards as an Anki package (.apkg) into a binary file
+
+    The package is a zip holding a collection.anki2 SQLite database and an
+    empty media map. Notes and cards are bulk-inserted in one transaction.
+    Deck ids and note GUIDs are derived from names and card text, so
+    importing the same deck twice doesn't duplicate its notes.
+    """
+    now = int(time.time())
+    deck_id = _stable_id(f"deck:{deck_name}")
+    model_id = _stable_id("model:Flashcard Generator Basic")
+    id_base = now * 1000
+
+    def rows():
+        for position, (question, answer, difficulty) in enumerate(_rows(flashcards)):
+            front = html.escape(question).replace("\n", "<br>")
+            back = html.escape(answer).replace("\n", "<br>")
+            digest = hashlib.sha1(f"{question}\x1f{answer}".encode("utf-8")).hexdigest()
+            checksum = int(hashlib.sha1(question.encode("utf-8")).hexdigest()[:8], 16)
+            tags = f" {difficulty.replace(' ', '_')} "
+            yield (id_base + position, digest[:10], model_id, now, -1, tags,
+                   f"{front}\x1f{back}", front, checksum, 0, "")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "collection.anki2")
+        connection = sqlite3.connect(path)
+        try:
+            connection.executescript(_ANKI_SCHEMA)
+            with connection:
+                connection.execute("INSERT INTO col VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                                   _anki_collection(deck_name, deck_id, model_id, now))
+                connection.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows())
+                # One card per note; note ids are id_base + deck position, which doubles as the new-card due order
+                connection.execute("INSERT INTO cards SELECT id, id, ?, 0, mod, -1, 0, 0, id - ?, "
+                                   "0, 0, 0, 0, 0, 0, 0, 0, '' FROM notes", (deck_id, id_base))
+        finally:
+            connection.close()
+
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as package:
+            package.write(path, "collection.anki2")
+            package.writestr("media", "{}")
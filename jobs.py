@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Environment variables that size the process-wide queue
+JOB_WORKERS_ENV = "FLASHCARD_JOB_WORKERS"          # decks generated at the same time
+JOB_QUEUE_DEPTH_ENV = "FLASHCARD_JOB_QUEUE_DEPTH"  # decks allowed to wait for a worker
+JOB_PER_OWNER_ENV = "FLASHCARD_JOB_PER_SESSION"    # unfinished decks per session
+
+FINISHED_STATES = ("done", "cancelled", "failed")
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when a job can't be accepted right now"""
+
+
+class Job:
+    """One background generation: its status, progress and the cards so far
+
+    The worker appends to cards and messages while the page reads them, so
+    readers should go through snapshot(). The job doubles as the
+    generator's listener (see FlashcardGenerator.listener).
+    """
+
+    def __init__(self, owner: Optional[str], total: int):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.total = total
+        self.status = "queued"
+        self.cards: List[Dict] = []
+        self.messages: List[Dict[str, str]] = []
+        self.progress_text = ""
+        self.progress_fraction = 0.0
+        self.result: Dict = {}
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def cancel_event(self) -> threading.Event:
+        """Set on cancel; work that blocks can wait on it to stop promptly"""
+        return self._cancel
+
+    def cancel(self):
+        """Ask the job to stop; a generator given cancel_event stops even mid-wait"""
+        self._cancel.set()
+
+    def add_card(self, card: Dict):
+        with self._lock:
+            self.cards.append(card)
+
+    def notify(self, level: str, message: str):
+        with self._lock:
+            if message and not any(m["message"] == message for m in self.messages):
+                self.messages.append({"level": level, "message": message})
+
+    def progress(self, fraction: float, text: str):
+        with self._lock:
+            self.progress_fraction = fraction
+            self.progress_text = text
+
+    def snapshot(self) -> Dict:
+        """Consistent copy of the job's state for rendering"""
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "cards": list(self.cards),
+                "total": self.total,
+                "messages": list(self.messages),
+                "progress_text": self.progress_text,
+                "progress_fraction": self.progress_fraction,
+                "result": dict(self.result),
+                "error": self.error,
+                "submitted_at": self.submitted_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobQueue:
+    """Process-wide pool that runs generation jobs off the Streamlit script thread
+
+    At most max_workers jobs run at once and at most max_queued wait for a
+    worker; beyond that submit() raises QueueFull instead of letting the
+    backlog grow. max_per_owner caps the unfinished jobs of one session,
+    so one heavy upload can't take every slot. Finished jobs are kept for
+    retain_seconds so a reloaded page can still pick up its deck.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 8, max_per_owner: int = 1,
+                 retain_seconds: float = 3600.0):
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max(0, max_queued)
+        self.max_per_owner = max(1, max_per_owner)
+        self.retain_seconds = retain_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="flashcard-job")
+
+    def submit(self, work: Callable[[Job], Dict], owner: Optional[str] = None, total: int = 0) -> Job:
+        """Queue work(job) and return the job; work returns the job's result dict"""
+        with self._lock:
+            self._prune()
+            # A job cancelled while queued only waits to be discarded
+            active = [job for job in self._jobs.values()
+                      if not job.finished and not (job.status == "queued" and job.cancelled)]
+            if owner is not None and sum(job.owner == owner for job in active) >= self.max_per_owner:
+                raise QueueFull("A deck is already being generated for this session")
+            queued = sum(job.status == "queued" for job in active)
+            running = len(active) - queued
+            if running >= self.max_workers and queued >= self.max_queued:
+                raise QueueFull(f"The generation queue is full ({queued} decks waiting), please try again shortly")
+            job = Job(owner, total)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def position(self, job: Job) -> int:
+        """How many queued jobs were submitted before job (0 once it runs)"""
+        if job.status != "queued":
+            return 0
+        with self._lock:
+            return sum(other.status == "queued" and other.submitted_at < job.submitted_at
+                       for other in self._jobs.values())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "done": 0, "cancelled": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def _run(self, job: Job, work: Callable[[Job], Dict]):
+        if job.cancelled:
+            job.finished_at = time.time()
+            job.status = "cancelled"
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            result = work(job) or {}
+            with job._lock:
+                job.result = result
+            status = "cancelled" if job.cancelled else "done"
+        except Exception as e:
+            job.error = str(e)
+            status = "failed"
+        # finished_at goes first: pollers treat the status as the signal that everything is in place
+        job.finished_at = time.time()
+        job.status = status
+
+    def _prune(self):
+        cutoff = time.time() - self.retain_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue(**options) -> JobQueue:
+    """Return the queue shared by every session in the process
+
+    Options not given are read from FLASHCARD_JOB_WORKERS,
+    FLASHCARD_JOB_QUEUE_DEPTH and FLASHCARD_JOB_PER_SESSION. Only the
+    first call's options take effect.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            for option, env in (("max_workers", JOB_WORKERS_ENV), ("max_queued", JOB_QUEUE_DEPTH_ENV),
+                                ("max_per_owner", JOB_PER_OWNER_ENV)):
+                if option not in options and os.environ.get(env):
+                    options[option] = int(os.environ[env])
+            _queue = JobQueue(**options)
+        return _queue
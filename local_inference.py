@@ -0,0 +1,74 @@
+import threading
+from typing import Dict, List, Optional
+
+_models: Dict[str, "LocalSeq2SeqModel"] = {}
+# A load can take minutes, so each checkpoint gets its own load lock; _models_lock only guards that dict
+_load_locks: Dict[str, threading.Lock] = {}
+_models_lock = threading.Lock()
+
+
+class LocalSeq2SeqModel:
+    """A seq2seq checkpoint (e.g. flan-t5) running on the local CPU
+
+    Loading is expensive, so instances are shared process-wide through
+    get_local_model. generate() is serialized with a lock: torch already
+    spreads one batch over num_threads cores, and interleaving batches from
+    several sessions would only thrash the caches.
+    """
+
+    def __init__(self, checkpoint: str):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        self.checkpoint = checkpoint
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(checkpoint)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(checkpoint)
+        self.model.eval()
+        self._lock = threading.Lock()
+
+    def generate(self, prompts: List[str], parameters: Dict, max_batch: int = 8,
+                 num_threads: Optional[int] = None) -> List[str]:
+        """Run batched generation and return one decoded string per prompt
+
+        num_threads sets torch's (process-wide) intra-op CPU thread count.
+        """
+        generate_kwargs = {"max_new_tokens": parameters.get("max_length", 200),
+                           "do_sample": parameters.get("do_sample", False)}
+        if generate_kwargs["do_sample"] and "temperature" in parameters:
+            generate_kwargs["temperature"] = parameters["temperature"]
+
+        outputs = []
+        with self._lock, self._torch.inference_mode():
+            if num_threads:
+                self._torch.set_num_threads(num_threads)
+            for start in range(0, len(prompts), max_batch):
+                batch = prompts[start:start + max_batch]
+                inputs = self.tokenizer(batch, return_tensors="pt", padding=True,
+                                        truncation=True, max_length=512)
+                generated = self.model.generate(**inputs, **generate_kwargs)
+                outputs.extend(self.tokenizer.batch_decode(generated, skip_special_tokens=True))
+        return outputs
+
+
+def get_local_model(checkpoint: str) -> LocalSeq2SeqModel:
+    """Return the process-wide model for checkpoint, loading it on first use
+
+    Only callers asking for the same checkpoint wait while it loads.
+    """
+    model = _models.get(checkpoint)
+    if model is not None:
+        return model
+    with _models_lock:
+        load_lock = _load_locks.setdefault(checkpoint, threading.Lock())
+    with load_lock:
+        model = _models.get(checkpoint)
+        if model is None:
+            model = LocalSeq2SeqModel(checkpoint)
+            _models[checkpoint] = model
+        return model
+
+
+def is_local_model_loaded(checkpoint: str) -> bool:
+    """True if checkpoint is already loaded in this process; never waits for a load in progress"""
+    return checkpoint in _models
@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Environment variables that switch on the exporters
+METRICS_FILE_ENV = "FLASHCARD_METRICS_FILE"  # Prometheus text file, rewritten after every deck
+METRICS_LOG_ENV = "FLASHCARD_METRICS_LOG"    # JSON lines, one per finished deck
+METRICS_PORT_ENV = "FLASHCARD_METRICS_PORT"  # HTTP port serving /metrics
+METRICS_HOST_ENV = "FLASHCARD_METRICS_HOST"  # interface that port is bound to (default 127.0.0.1)
+
+logger = logging.getLogger("flashcards.metrics")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Histogram:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self, size: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * size
+
+
+class MetricsRegistry:
+    """Process-wide counters and stage-duration histograms
+
+    Stages are timed with time() or observe() and counters bumped with
+    increment(); both take free-form labels such as stage and backend. The
+    registry renders itself in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[LabelKey, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        """Add value to the counter name"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, stage: str, seconds: float, **labels):
+        """Record one run of stage that took seconds"""
+        key = _label_key(dict(labels, stage=stage))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.count += 1
+            histogram.total += seconds
+            histogram.max = max(histogram.max, seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram.buckets[i] += 1
+                    break
+
+    @contextmanager
+    def time(self, stage: str, **labels):
+        """Time the body of a with block as one run of stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """Plain-dict copy of every counter and stage summary"""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(key), "value": value}
+                        for (name, key), value in sorted(self._counters.items())]
+            stages = [{"labels": dict(key), "count": h.count, "seconds": h.total, "max_seconds": h.max}
+                      for key, h in sorted(self._histograms.items())]
+        return {"counters": counters, "stages": stages}
+
+    def prometheus_text(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            by_name: Dict[str, List[Tuple[LabelKey, float]]] = {}
+            for (name, key), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append((key, value))
+            for name, samples in by_name.items():
+                metric = f"flashcards_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.extend(f"{metric}{_format_labels(key)} {value:g}" for key, value in samples)
+
+            if self._histograms:
+                metric = "flashcards_stage_seconds"
+                lines.append(f"# HELP {metric} Time spent in each generation stage")
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in sorted(self._histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram.buckets):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.total:.6f}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Atomically replace path with the current metrics (textfile collector style)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+class DeckMetrics:
+    """Stage timings and counters for one generation run
+
+    Updated from the generator's worker threads, so every update takes a
+    lock. summary() is what the JSON log and the sidebar panel show.
+    """
+
+    def __init__(self, backend: str, subject: str, num_cards: int):
+        self.backend = backend
+        self.subject = subject
+        self.num_cards = num_cards
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.total_seconds: Optional[float] = None
+        self.cards = 0
+        self.stages: Dict[str, float] = {}
+        self.stage_runs: Dict[str, int] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.stage_runs[stage] = self.stage_runs.get(stage, 0) + 1
+
+    def increment(self, name: str, value: float = 1.0):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def finish(self, cards: int):
+        self.cards = cards
+        self.total_seconds = time.perf_counter() - self._started
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "event": "deck_generated",
+                "timestamp": self.started_at,
+                "backend": self.backend,
+                "subject": self.subject,
+                "requested_cards": self.num_cards,
+                "cards": self.cards,
+                "total_seconds": round(self.total_seconds or 0.0, 4),
+                "stages": {stage: {"seconds": round(seconds, 4), "runs": self.stage_runs[stage]}
+                           for stage, seconds in self.stages.items()},
+                "api_calls": int(self.counters.get("api_calls", 0)),
+                "fallbacks": int(self.counters.get("fallbacks", 0)),
+                "fallback_cards": int(self.counters.get("fallback_cards", 0)),
+                "counters": {name: value for name, value in self.counters.items()},
+            }
+
+
+_registry = MetricsRegistry()
+_log_handler_path: Optional[str] = None
+_server: Optional[ThreadingHTTPServer] = None
+_setup_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the registry shared by every generator in the process"""
+    return _registry
+
+
+def record_deck(deck: DeckMetrics):
+    """Publish a finished deck: registry totals, JSON log line and Prometheus file"""
+    summary = deck.summary()
+    _registry.increment("decks", backend=deck.backend)
+    _registry.increment("cards", deck.cards, backend=deck.backend)
+    _registry.observe("deck_total", summary["total_seconds"], backend=deck.backend)
+
+    _ensure_log_handler()
+    logger.info(json.dumps(summary, sort_keys=True))
+
+    path = os.environ.get(METRICS_FILE_ENV)
+    if path:
+        try:
+            _registry.write_prometheus(path)
+        except OSError as e:
+            logger.warning("Could not write metrics file %s: %s", path, e)
+
+
+def _ensure_log_handler():
+    """Attach a JSON-lines file handler when FLASHCARD_METRICS_LOG is set"""
+    global _log_handler_path
+    path = os.environ.get(METRICS_LOG_ENV)
+    if not path or path == _log_handler_path:
+        return
+    with _setup_lock:
+        if path != _log_handler_path:
+            handler = logging.FileHandler(path, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            _log_handler_path = path
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[int]:
+    """Serve /metrics on port (default FLASHCARD_METRICS_PORT) once per process
+
+    The server listens on host (default FLASHCARD_METRICS_HOST, else only
+    on 127.0.0.1); use "0.0.0.0" to let other machines scrape it. Returns
+    the port being served, or None when no port is configured.
+    """
+    global _server
+    if port is None:
+        port = int(os.environ.get(METRICS_PORT_ENV) or 0) or None
+    if host is None:
+        host = os.environ.get(METRICS_HOST_ENV) or "127.0.0.1"
+    with _setup_lock:
+        if _server is not None:
+            return _server.server_address[1]
+        if port is None:
+            return None
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = _registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        _server = ThreadingHTTPServer((host, port), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server.server_address[1]
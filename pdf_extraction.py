@@ -0,0 +1,81 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+# Parsed document held by each pool worker, set once by _init_worker
+_worker_reader = None
+
+
+def _read_pdf_bytes(pdf_file) -> bytes:
+    """Return the raw bytes of a path, bytes object or file-like PDF"""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, "rb") as f:
+            return f.read()
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def _init_worker(pdf_bytes: bytes):
+    """Parse the document once per worker process instead of once per task"""
+    global _worker_reader
+    _worker_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+
+
+def _extract_page_range(start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) with the worker's reader"""
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def count_pdf_pages(pdf_file) -> int:
+    """Return the number of pages without extracting any text"""
+    return len(PyPDF2.PdfReader(io.BytesIO(_read_pdf_bytes(pdf_file))).pages)
+
+
+def iter_pdf_pages(pdf_file, page_range: Optional[Tuple[int, int]] = None,
+                   workers: Optional[int] = None, pages_per_task: int = 16,
+                   min_parallel_pages: int = 64) -> Iterator[str]:
+    """Yield the text of each page in order as soon as it has been parsed
+
+    page_range is an inclusive, 1-based (first, last) selection. Selections of
+    at least min_parallel_pages pages are split into ranges of pages_per_task
+    that a pool of worker processes extracts; pages are still yielded in
+    document order. Shorter selections are parsed serially, since starting the
+    pool costs more than it saves.
+    """
+    pdf_bytes = _read_pdf_bytes(pdf_file)
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(reader.pages)
+
+    first, last = page_range if page_range else (1, total_pages)
+    start, stop = max(0, first - 1), min(total_pages, last)
+    if start >= stop:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or stop - start < min_parallel_pages:
+        for i in range(start, stop):
+            yield reader.pages[i].extract_text() or ""
+        return
+
+    # Spawned workers avoid forking the threaded Streamlit server
+    ranges = [(s, min(s + pages_per_task, stop)) for s in range(start, stop, pages_per_task)]
+    executor = ProcessPoolExecutor(
+        max_workers=min(workers, len(ranges)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(pdf_bytes,)
+    )
+    try:
+        for pages in executor.map(_extract_page_range, *zip(*ranges)):
+            yield from pages
+    finally:
+        # A consumer that stops early shouldn't wait for the remaining ranges
+        executor.shutdown(cancel_futures=True)
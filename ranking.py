@@ -0,0 +1,108 @@
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z][a-z0-9-]{2,}")
+_DEFINITION = re.compile(
+    r"^[^:]{2,60}:\s|\b(?:is|are) (?:a|an|the|defined as|called|known as)\b|"
+    r"\b(?:refers? to|is defined as|consists? of|is the process)\b",
+    re.IGNORECASE
+)
+
+STOPWORDS = frozenset("""
+about above after again against all also and any are because been before being
+below between both but can could did does doing down during each few for from
+further had has have having her here hers him his how into its itself just more
+most not now off once only other our out over own same she should some such than
+that the their them then there these they this those through too under until very
+was were what when where which while who whom why will with would you your
+""".split())
+
+
+class SentenceRanker:
+    """Scores every sentence of a document for use as an offline flashcard
+
+    The score combines TF-IDF term salience (each sentence treated as a
+    document), a bonus for definition-style sentences, a bonus for sentences
+    that open a paragraph and a penalty for very short or very long ones.
+    All scoring after tokenization is vectorized with NumPy.
+    """
+
+    def __init__(self, definition_weight: float = 0.5, position_weight: float = 0.2,
+                 ideal_length: int = 120):
+        self.definition_weight = definition_weight
+        self.position_weight = position_weight
+        self.ideal_length = ideal_length
+
+    def score(self, sentences: Sequence[str], paragraph_starts: Optional[Sequence[bool]] = None) -> np.ndarray:
+        """Return one score per sentence"""
+        n = len(sentences)
+        if n == 0:
+            return np.zeros(0)
+
+        # Map every (sentence, term) occurrence to integer ids
+        vocabulary = {}
+        sentence_ids = []
+        term_ids = []
+        for i, sentence in enumerate(sentences):
+            for word in _WORD.findall(sentence.lower()):
+                if word not in STOPWORDS:
+                    sentence_ids.append(i)
+                    term_ids.append(vocabulary.setdefault(word, len(vocabulary)))
+
+        salience = np.zeros(n)
+        if term_ids:
+            sentence_ids = np.asarray(sentence_ids, dtype=np.int64)
+            term_ids = np.asarray(term_ids, dtype=np.int64)
+            pairs, tf = np.unique(sentence_ids * len(vocabulary) + term_ids, return_counts=True)
+            pair_sentences = pairs // len(vocabulary)
+            pair_terms = pairs % len(vocabulary)
+
+            df = np.bincount(pair_terms, minlength=len(vocabulary))
+            idf = np.log((1 + n) / (1 + df)) + 1.0
+            # Terms that recur across the document carry the topic; hapaxes are noise
+            topicality = np.log1p(np.bincount(term_ids, minlength=len(vocabulary)))
+            weights = (1 + np.log(tf)) * idf[pair_terms] * topicality[pair_terms]
+
+            salience = np.bincount(pair_sentences, weights=weights, minlength=n)
+            term_counts = np.bincount(sentence_ids, minlength=n)
+            salience /= np.sqrt(np.maximum(term_counts, 1))
+            if salience.max() > 0:
+                salience /= salience.max()
+
+        definitions = np.fromiter((bool(_DEFINITION.search(s)) for s in sentences), dtype=bool, count=n)
+        lengths = np.fromiter((len(s) for s in sentences), dtype=np.float64, count=n)
+        length_fit = np.exp(-np.abs(np.log(lengths / self.ideal_length)))
+
+        scores = salience * length_fit + self.definition_weight * definitions
+        if paragraph_starts is not None:
+            scores += self.position_weight * np.asarray(paragraph_starts, dtype=bool)
+        return scores
+
+    def select(self, sentences: Sequence[str], num_cards: int,
+               paragraph_starts: Optional[Sequence[bool]] = None) -> List[int]:
+        """Pick the indices of the best num_cards sentences, spread over the document
+
+        The document is cut into num_cards equal spans and the best sentence
+        of each span is taken first; any remaining picks go to the highest
+        scores overall. Indices are returned in document order.
+        """
+        n = len(sentences)
+        if n == 0 or num_cards <= 0:
+            return []
+        if num_cards >= n:
+            return list(range(n))
+
+        scores = self.score(sentences, paragraph_starts)
+        spans = np.arange(n) * num_cards // n
+        # Sort by span, then by descending score; the first entry of each span wins
+        order = np.lexsort((-scores, spans))
+        first_in_span = np.ones(n, dtype=bool)
+        first_in_span[1:] = spans[order][1:] != spans[order][:-1]
+        chosen = order[first_in_span]
+
+        if len(chosen) < num_cards:
+            remaining = np.setdiff1d(np.argsort(-scores, kind="stable"), chosen, assume_unique=True)
+            chosen = np.concatenate([chosen, remaining[:num_cards - len(chosen)]])
+        return sorted(chosen[:num_cards].tolist())
@@ -0,0 +1,295 @@
+import email.utils
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# How often a cancellable wait for a slot checks its cancel event (seconds)
+_CANCEL_POLL_SECONDS = 0.25
+
+
+class Cancelled(Exception):
+    """Raised by AdaptiveRateController.slot when the caller cancels while waiting"""
+
+
+class RateLimiter:
+    """Token-bucket limiter shared by every worker that talks to one endpoint"""
+
+    def __init__(self, rate: float = 2.0, burst: int = 1):
+        """Allow `rate` requests per second with bursts of up to `burst` requests"""
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """Change the sustained rate, keeping the tokens already accrued"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Block until a request slot is free, returning the time spent waiting"""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent requests so retries can't snowball
+
+    Every request deposits `ratio` tokens and every retry spends one; a
+    small floor of min_per_second keeps a trickle of retries available
+    when traffic is light.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget if any is left"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint that is clearly down
+
+    The breaker opens after failure_threshold consecutive failures and
+    rejects calls for reset_timeout seconds. It then lets a single trial
+    call through (half-open) and closes again if that call succeeds. A
+    trial that ends any other way must be given back with release_trial().
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_thread: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_thread = threading.get_ident()
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected"""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Give back this thread's trial call when it was neither a success nor a failure
+
+        Throttling, client errors and calls abandoned for the caller's own
+        deadline say nothing about whether the endpoint recovered, so the
+        breaker stays half-open and the next caller gets the trial. A no-op
+        for threads that don't hold the trial.
+        """
+        with self._lock:
+            if self._trial_in_flight and self._trial_thread == threading.get_ident():
+                self._trial_in_flight = False
+
+
+class AdaptiveRateController:
+    """AIMD control of in-flight requests and request rate for one endpoint
+
+    Successful calls grow the concurrency limit additively (about one extra
+    slot per limit's worth of successes) and nudge the rate up; throttling
+    (429/503) halves both and blocks new calls until Retry-After has passed.
+    The controller also owns the endpoint's retry budget and circuit breaker.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate: float = 2.0, min_rate: float = 0.2,
+                 max_rate: Optional[float] = None, max_retries: int = 3, base_backoff: float = 0.5,
+                 max_backoff: float = 30.0, rate_step: float = 0.25):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 4
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.rate_step = rate_step
+        self.limit = float(self.max_concurrency)
+        self.limiter = RateLimiter(rate, burst=self.max_concurrency)
+        self.retry_budget = RetryBudget()
+        self.breaker = CircuitBreaker()
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self, cancel: Optional[threading.Event] = None):
+        """Hold one in-flight slot, waiting for capacity, Retry-After and the rate limit
+
+        Setting cancel while waiting raises Cancelled instead of taking the slot.
+        """
+        with self._condition:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+                delay = self._blocked_until - time.monotonic()
+                if delay <= 0 and self.in_flight < int(self.limit):
+                    break
+                timeout = delay if delay > 0 else None
+                if cancel is not None:
+                    # Nothing notifies the condition on cancel, so look again regularly
+                    timeout = min(timeout or _CANCEL_POLL_SECONDS, _CANCEL_POLL_SECONDS)
+                self._condition.wait(timeout=timeout)
+            self.in_flight += 1
+        try:
+            self.limiter.acquire()
+            self.retry_budget.record_request()
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def set_max_concurrency(self, max_concurrency: int):
+        """Change the ceiling the concurrency limit can grow to"""
+        with self._condition:
+            self.max_concurrency = max(1, max_concurrency)
+            self.limit = min(self.limit, self.max_concurrency)
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.breaker.record_success()
+        with self._condition:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self.limiter.set_rate(min(self.max_rate, self.limiter.rate + self.rate_step))
+            self._condition.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429/503, honoring Retry-After"""
+        with self._condition:
+            self.throttle_events += 1
+            self.limit = max(1.0, self.limit / 2)
+            self.limiter.set_rate(max(self.min_rate, self.limiter.rate / 2))
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def on_failure(self):
+        """Record an error that says the endpoint may be down (5xx, timeout)"""
+        self.breaker.record_failure()
+
+    def retry_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retry number attempt+1, or None to give up"""
+        if attempt >= self.max_retries or self.breaker.is_open() or not self.retry_budget.try_spend():
+            return None
+        # Full jitter keeps retries from many workers from synchronizing
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def snapshot(self) -> Dict:
+        """Current controller state for monitoring"""
+        with self._condition:
+            blocked_for = max(0.0, self._blocked_until - time.monotonic())
+            return {
+                "breaker_state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "rate_per_second": round(self.limiter.rate, 3),
+                "retry_budget": round(self.retry_budget.available, 2),
+                "throttle_events": self.throttle_events,
+                "blocked_for_seconds": round(blocked_for, 1)
+            }
+
+
+_shared_controllers: Dict[str, AdaptiveRateController] = {}
+_shared_controllers_lock = threading.Lock()
+
+
+def get_rate_controller(key: str, **options) -> AdaptiveRateController:
+    """Return the process-wide controller for `key`, creating it on first use"""
+    with _shared_controllers_lock:
+        controller = _shared_controllers.get(key)
+        if controller is None:
+            controller = AdaptiveRateController(**options)
+            _shared_controllers[key] = controller
+        return controller
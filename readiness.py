@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# A probe returns True when the model answered, None while it is still
+# loading (retry later) and False on a hard failure such as a bad token.
+Probe = Callable[[], Optional[bool]]
+
+
+class ModelReadiness:
+    """Process-wide view of whether a model endpoint is warm
+
+    A positive result is trusted for ready_ttl seconds, and successful
+    generation requests refresh it via mark_ready(), so warm models cost no
+    extra round trip. When the state is unknown a daemon thread probes the
+    endpoint with jittered exponential backoff while callers wait on an
+    event instead of sleeping in fixed steps.
+
+    A probe that fails is not restarted for failure_cooldown seconds, so
+    callers that ask on every page rerun don't hammer the endpoint. A hard
+    failure (e.g. a rejected token) only holds back probes from the same
+    caller, since another caller's credentials may work; giving up on a
+    model that never loads holds back everyone.
+    """
+
+    def __init__(self, ready_ttl: float = 300.0, initial_backoff: float = 1.0,
+                 max_backoff: float = 20.0, max_probe_time: float = 180.0, failure_cooldown: float = 60.0):
+        self.ready_ttl = ready_ttl
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_probe_time = max_probe_time
+        self.failure_cooldown = failure_cooldown
+        self.state = "unknown"
+        self.last_error: Optional[str] = None
+        self._ready_at = 0.0
+        self._ready_event = threading.Event()
+        self._done_event = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+        # Monotonic times before which no new probe starts: for everyone, and per caller
+        self._retry_at = 0.0
+        self._rejected_until: Dict[Optional[str], float] = {}
+        self._lock = threading.Lock()
+
+    def is_ready(self) -> bool:
+        """True if the model answered within the last ready_ttl seconds"""
+        return self.state == "ready" and time.monotonic() - self._ready_at < self.ready_ttl
+
+    def mark_ready(self):
+        """Record a successful response from the model"""
+        with self._lock:
+            self.state = "ready"
+            self._ready_at = time.monotonic()
+            self._retry_at = 0.0
+            self._ready_event.set()
+
+    def mark_loading(self):
+        """Record that the endpoint reported the model as loading"""
+        with self._lock:
+            self.state = "loading"
+            self._ready_event.clear()
+
+    def is_rejected(self, caller: Optional[str] = None) -> bool:
+        """True while caller's last probe failed hard and its cool-down hasn't passed"""
+        return time.monotonic() < self._rejected_until.get(caller, 0.0)
+
+    def ensure_probing(self, probe: Probe, caller: Optional[str] = None):
+        """Start a background probe unless the model is warm, one is running or a failure is cooling down
+
+        caller identifies whose credentials probe uses, e.g. a hash of the token.
+        """
+        with self._lock:
+            if self.is_ready() or (self._probe_thread and self._probe_thread.is_alive()):
+                return
+            if time.monotonic() < self._retry_at or self.is_rejected(caller):
+                return
+            self.state = "loading"
+            self._ready_event.clear()
+            self._done_event.clear()
+            self._probe_thread = threading.Thread(target=self._probe_loop, args=(probe, caller), daemon=True)
+            self._probe_thread.start()
+
+    def wait_until_ready(self, probe: Probe, timeout: float, caller: Optional[str] = None,
+                         cancel: Optional[threading.Event] = None) -> bool:
+        """Return once the model is ready, the probe gives up or timeout passes
+
+        Setting cancel stops the wait early (returning False); the probe
+        itself carries on for other callers.
+        """
+        if self.is_ready():
+            return True
+        self.ensure_probing(probe, caller)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if cancel is not None and cancel.is_set():
+                return False
+            if self._ready_event.wait(min(0.5, max(0.0, deadline - time.monotonic()))):
+                return True
+            if self._done_event.is_set() and not self._ready_event.is_set():
+                return False
+        return self.is_ready()
+
+    def _probe_loop(self, probe: Probe, caller: Optional[str]):
+        backoff = self.initial_backoff
+        started = time.monotonic()
+        try:
+            while time.monotonic() - started < self.max_probe_time:
+                try:
+                    result = probe()
+                except Exception as e:
+                    self.last_error = str(e)
+                    result = None
+
+                if result is True:
+                    self.mark_ready()
+                    self._rejected_until.pop(caller, None)
+                    return
+                if result is False:
+                    # Hard failures (e.g. a bad token) aren't a property of the model,
+                    # so don't publish them as shared state; only this caller backs off
+                    with self._lock:
+                        self.state = "unknown"
+                        self._rejected_until[caller] = time.monotonic() + self.failure_cooldown
+                    return
+
+                time.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, self.max_backoff)
+
+            with self._lock:
+                self.state = "unavailable"
+                self._retry_at = time.monotonic() + self.failure_cooldown
+        finally:
+            self._done_event.set()
+
+
+_trackers: Dict[str, ModelReadiness] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_readiness_tracker(endpoint: str, **options) -> ModelReadiness:
+    """Return the readiness tracker shared by every session using endpoint"""
+    with _trackers_lock:
+        tracker = _trackers.get(endpoint)
+        if tracker is None:
+            tracker = ModelReadiness(**options)
+            _trackers[endpoint] = tracker
+        return tracker
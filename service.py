@@ -0,0 +1,280 @@
+"""
+HTTP generation service: the FlashcardGenerator without the Streamlit UI
+
+    python service.py --port 8080 --max-workers 4 --per-client 2
+    curl -s localhost:8080/v1/decks -H 'Content-Type: application/json' \\
+         -d '{"content": "...", "subject": "Biology", "num_cards": 10, "backend": "offline"}'
+    curl -s "localhost:8080/v1/decks?format=apkg" -F file=@notes.pdf -F subject=Biology -o deck.apkg
+
+POST /v1/decks takes JSON (content, subject, num_cards, backend and an
+optional time_limit in seconds) or a multipart form with a .pdf/.txt
+"file" and the same fields. It returns
+{"cards": [...], ...}, or with ?format=csv|json|anki|apkg the deck as an
+export. Identical requests that arrive while one is being generated
+share that single computation. Each client (X-Client-Id header, else its
+address) gets at most --per-client requests in flight; more are refused
+with 429 and Retry-After. GET /healthz and GET /metrics are also served.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+from PyPDF2.errors import PdfReadError
+
+from app import FlashcardGenerator, quiet_streamlit_logging
+from exporters import iter_anki_text, iter_csv, iter_json, write_apkg, write_text
+from metrics import get_metrics
+
+BACKENDS = ("huggingface", "local", "offline")
+MAX_CARDS = 100
+EXPORTS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "json": (iter_json, "application/json", "json"),
+    "anki": (iter_anki_text, "text/plain", "txt"),
+}
+
+logger = logging.getLogger("flashcards.service")
+
+# (document sha256, document kind, subject, num_cards, backend, time_limit)
+RequestKey = Tuple[str, str, str, int, str, float]
+
+
+class _LogListener:
+    """Generator listener that sends the messages a page would show to the log"""
+
+    def notify(self, level: str, message: str):
+        if message:
+            logger.log(logging.INFO if level == "info" else logging.WARNING, message)
+
+    def progress(self, fraction: float, text: str):
+        pass
+
+
+class GenerationService:
+    """Runs decks on a thread pool, merging identical in-flight requests
+
+    A fresh generator is built per computation, so concurrent decks never
+    share per-deck state; the HTTP pool, rate controller and readiness
+    tracker behind them are process-wide either way. max_workers caps the
+    decks generated at once and per_client the requests one client may
+    have in flight. generator_options are passed to every generator.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, max_workers: int = 4, per_client: int = 2,
+                 generator_options: Optional[Dict] = None):
+        self.api_key = api_key
+        self.per_client = max(1, per_client)
+        self.generator_options = dict(generator_options or {})
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="flashcard-service")
+        self.metrics = get_metrics()
+        self._inflight: Dict[RequestKey, asyncio.Future] = {}
+        self._client_requests: Dict[str, int] = {}
+
+    def build_generator(self, backend: str) -> FlashcardGenerator:
+        generator = FlashcardGenerator(self.api_key, backend, incremental=False, **self.generator_options)
+        generator.listener = _LogListener()
+        return generator
+
+    def _generate_sync(self, document: bytes, kind: str, subject: str, num_cards: int, backend: str,
+                       time_limit: float = 0) -> Dict:
+        started = time.perf_counter()
+        deadline = time.monotonic() + time_limit if time_limit else None
+        generator = self.build_generator(backend)
+        if kind == "pdf":
+            # Pages are chunked as they are parsed, so generation doesn't wait for the whole document
+            pages = []
+
+            def read_pages():
+                for page in generator.iter_pdf_pages(document):
+                    pages.append(page)
+                    yield page + "\n"
+
+            try:
+                cards = generator.generate_flashcards(read_pages(), subject, num_cards, deadline=deadline)
+            except PdfReadError as e:
+                raise ValueError(f"Could not read the uploaded PDF: {e}")
+            content = "".join(pages)
+        else:
+            content = document.decode("utf-8", errors="replace")
+            cards = None
+        if len(content.strip()) < 50:
+            raise ValueError("Content is too short to generate flashcards from")
+        if cards is None:
+            cards = generator.generate_flashcards(content, subject, num_cards, deadline=deadline)
+        return {"subject": subject, "backend": backend, "num_cards": num_cards, "cards": cards,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+    async def generate(self, document: bytes, kind: str, subject: str, num_cards: int,
+                       backend: str, time_limit: float = 0) -> Tuple[Dict, bool]:
+        """Return (deck, coalesced); coalesced is True when another request's computation was reused"""
+        key = (hashlib.sha256(document).hexdigest(), kind, subject, num_cards, backend, time_limit)
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = loop.run_in_executor(
+                self.executor, self._generate_sync, document, kind, subject, num_cards, backend, time_limit)
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.metrics.increment("coalesced_requests", backend=backend)
+        # A waiter that disconnects must not cancel the computation the others share
+        return await asyncio.shield(task), coalesced
+
+    def acquire_client(self, client: str) -> bool:
+        """Take one of client's request slots; False when it already has per_client in flight"""
+        if self._client_requests.get(client, 0) >= self.per_client:
+            return False
+        self._client_requests[client] = self._client_requests.get(client, 0) + 1
+        return True
+
+    def release_client(self, client: str):
+        remaining = self._client_requests.get(client, 1) - 1
+        if remaining > 0:
+            self._client_requests[client] = remaining
+        else:
+            self._client_requests.pop(client, None)
+
+
+async def _read_request(request: web.Request) -> Tuple[bytes, str, Dict]:
+    """Return (document, kind, fields) from a JSON body or a multipart upload"""
+    if request.content_type == "multipart/form-data":
+        fields: Dict = {}
+        document, kind = b"", "text"
+        async for part in await request.multipart():
+            if part.name == "file":
+                document = await part.read()
+                filename = (part.filename or "").lower()
+                kind = "pdf" if filename.endswith(".pdf") or document.startswith(b"%PDF") else "text"
+            else:
+                fields[part.name] = await part.text()
+        return document, kind, fields
+
+    try:
+        fields = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Expected a JSON body or a multipart upload")
+    if not isinstance(fields, dict) or not isinstance(fields.get("content"), str):
+        raise web.HTTPBadRequest(text='The JSON body needs a "content" string')
+    return fields["content"].encode("utf-8"), "text", fields
+
+
+def _client_id(request: web.Request) -> str:
+    return request.headers.get("X-Client-Id") or request.remote or "unknown"
+
+
+async def handle_decks(request: web.Request) -> web.StreamResponse:
+    service: GenerationService = request.app["service"]
+    client = _client_id(request)
+    if not service.acquire_client(client):
+        service.metrics.increment("rejected_requests", reason="client_limit")
+        raise web.HTTPTooManyRequests(text=f"At most {service.per_client} requests in flight per client",
+                                      headers={"Retry-After": "1"})
+    try:
+        document, kind, fields = await _read_request(request)
+        if not document:
+            raise web.HTTPBadRequest(text="No content was provided")
+        subject = str(fields.get("subject") or "General")
+        backend = str(fields.get("backend") or "offline")
+        try:
+            num_cards = int(fields.get("num_cards") or 15)
+            time_limit = float(fields.get("time_limit") or 0)
+        except (TypeError, ValueError):
+            raise web.HTTPBadRequest(text="num_cards must be an integer and time_limit a number")
+        if not math.isfinite(time_limit) or time_limit < 0:
+            raise web.HTTPBadRequest(text="time_limit must be a finite, non-negative number")
+        if backend not in BACKENDS:
+            raise web.HTTPBadRequest(text=f"backend must be one of {', '.join(BACKENDS)}")
+        if not 1 <= num_cards <= MAX_CARDS:
+            raise web.HTTPBadRequest(text=f"num_cards must be between 1 and {MAX_CARDS}")
+        if backend == "huggingface" and not service.api_key:
+            raise web.HTTPBadRequest(text="This service has no Hugging Face token configured")
+        export_format = request.query.get("format")
+        if export_format and export_format not in EXPORTS and export_format != "apkg":
+            raise web.HTTPBadRequest(text="format must be csv, json, anki or apkg")
+
+        try:
+            deck, coalesced = await service.generate(document, kind, subject, num_cards, backend, time_limit)
+        except ValueError as e:
+            raise web.HTTPUnprocessableEntity(text=str(e))
+        headers = {"X-Coalesced": "1" if coalesced else "0"}
+        if not export_format:
+            return web.json_response(dict(deck, coalesced=coalesced), headers=headers)
+
+        # Exports of large decks take a while; keep them off the event loop
+        body, content_type, extension = await asyncio.get_running_loop().run_in_executor(
+            None, render_export, deck["cards"], export_format, subject)
+        headers["Content-Disposition"] = f'attachment; filename="flashcards.{extension}"'
+        return web.Response(body=body, content_type=content_type, headers=headers)
+    finally:
+        service.release_client(client)
+
+
+def render_export(cards, export_format: str, deck_name: str) -> Tuple[bytes, str, str]:
+    """Return (body, content type, file extension) of cards exported as export_format"""
+    out = io.BytesIO()
+    if export_format == "apkg":
+        write_apkg(cards, out, deck_name=deck_name)
+        content_type, extension = "application/octet-stream", "apkg"
+    else:
+        iterator, content_type, extension = EXPORTS[export_format]
+        write_text(iterator(cards), out)
+    return out.getvalue(), content_type, extension
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    service: GenerationService = request.app["service"]
+    return web.json_response({"status": "ok", "inflight": len(service._inflight)})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=get_metrics().prometheus_text(), content_type="text/plain")
+
+
+def make_app(service: GenerationService, max_upload_bytes: int = 50 * 1024 * 1024) -> web.Application:
+    app = web.Application(client_max_size=max_upload_bytes)
+    app["service"] = service
+    app.router.add_post("/v1/decks", handle_decks)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+
+    async def shutdown(app):
+        service.executor.shutdown(wait=False, cancel_futures=True)
+
+    app.on_shutdown.append(shutdown)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP service generating flashcard decks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--api-key", default=os.environ.get("HF_API_TOKEN"),
+                        help="Hugging Face token for the huggingface backend (default: $HF_API_TOKEN)")
+    parser.add_argument("--api-url", help="override the inference endpoint")
+    parser.add_argument("--max-workers", type=int, default=4, help="decks generated at the same time")
+    parser.add_argument("--per-client", type=int, default=2, help="requests one client may have in flight")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="API requests in flight per deck")
+    parser.add_argument("--packed", action="store_true", help="ask for all of a chunk's cards in one prompt")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    quiet_streamlit_logging()
+
+    service = GenerationService(args.api_key, args.max_workers, args.per_client,
+                                {"api_url": args.api_url, "max_concurrency": args.max_concurrency,
+                                 "packed": args.packed})
+    web.run_app(make_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()